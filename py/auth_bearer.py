@@ -0,0 +1,44 @@
+# MCPクライアントの httpx.AsyncClient に渡す Bearer トークン認証
+# リクエストごとに TokenManager から現在のトークンを付けるので、期限切れのたびに
+# streamable_http_client / ClientSession を作り直さずに同じセッションを使い続けられる
+#
+#   async with token_manager, httpx.AsyncClient(auth=BearerTokenAuth(token_manager)) as http_client:
+#       async with streamable_http_client(url, http_client=http_client) as (read, write, _):
+#           ...
+from collections.abc import AsyncGenerator, Generator
+
+import httpx
+
+from auth_token_manager import TokenManager
+
+
+class BearerTokenAuth(httpx.Auth):
+    """現在のトークンを Authorization ヘッダーに付ける。
+
+    - 期限が近いトークンは送る前に取り直す（TokenManager.get_token）
+    - 401 が返ったらトークンを取り直し、同じリクエストを1回だけ送り直す
+    """
+
+    # 401 のあとに送り直せるよう、リクエストボディを読み込んでおく
+    requires_request_body = True
+
+    def __init__(self, manager: TokenManager) -> None:
+        self.manager = manager
+        self.retried = 0
+
+    def sync_auth_flow(self, request: httpx.Request) -> Generator[httpx.Request, httpx.Response, None]:
+        raise RuntimeError("BearerTokenAuth can only be used with httpx.AsyncClient")
+
+    async def async_auth_flow(self, request: httpx.Request) -> AsyncGenerator[httpx.Request, httpx.Response]:
+        token = await self.manager.get_token()
+        request.headers["Authorization"] = f"Bearer {token}"
+        response = yield request
+        if response.status_code != 401:
+            return
+
+        # 拒否されたトークンだけを捨てる（他のリクエストがもう取り直していればそれを使う）
+        self.manager.invalidate(token)
+        self.retried += 1
+        token = await self.manager.get_token()
+        request.headers["Authorization"] = f"Bearer {token}"
+        yield request
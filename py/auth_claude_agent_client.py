@@ -1,6 +1,4 @@
 import asyncio
-import os
-import httpx
 from dotenv import load_dotenv
 
 from claude_agent_sdk import (
@@ -13,42 +11,18 @@ from claude_agent_sdk import (
     TextBlock,
 )
 
+from auth_token_manager import get_access_token
+
 load_dotenv()
 
 STREAMABLE_HTTP_URL = "http://127.0.0.1:8000/mcp"
 
-OAUTH_CLIENT_ID = os.getenv("OAUTH_CLIENT_ID")
-OAUTH_CLIENT_SECRET = os.getenv("OAUTH_CLIENT_SECRET")
-KEYCLOAK_BASE = "http://localhost:8080"
-REALM = "master"
-WELL_KNOWN_ENDPOINT = f"{KEYCLOAK_BASE}/realms/{REALM}/.well-known/openid-configuration"
 
 REQUIRED_SCOPE = "mcp:tools"
 
 
-async def get_access_token() -> str:
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(WELL_KNOWN_ENDPOINT)
-        r.raise_for_status()
-        token_url = r.json()["token_endpoint"]
-
-        r = await client.post(
-            token_url,
-            data={
-                "grant_type": "client_credentials",
-                "client_id": OAUTH_CLIENT_ID,
-                "client_secret": OAUTH_CLIENT_SECRET,
-                "scope": REQUIRED_SCOPE,
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        print("get_access_token", token_url, r.status_code)
-        r.raise_for_status()
-        return r.json()["access_token"]
-
-
 async def main() -> None:
-    token = await get_access_token()
+    token = await get_access_token(REQUIRED_SCOPE)
 
     # Claude Agent SDK 側の MCP 設定（HTTP + headers）
     # - mcp_servers: dict[str, McpServerConfig]
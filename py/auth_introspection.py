@@ -0,0 +1,159 @@
+# RFC 7662 トークンイントロスペクションでアクセストークンを検証する（js/src/auth_server.ts と同じ方式）
+# 毎回Keycloakに問い合わせるとリクエストごとに往復が増えるので
+# - Keycloakへの接続はプールして使い回す
+# - 有効/無効の結果をそれぞれ短いTTLでキャッシュする（有効な結果はトークンの exp を超えない）
+# - 同じトークンの同時の問い合わせは1回にまとめる
+# - hybrid: JWTはローカルで検証し、JWTでない（opaqueな）トークンだけを問い合わせる
+import logging
+import time
+from typing import Any
+
+import httpx
+import jwt
+from mcp.server.auth.provider import AccessToken, TokenVerifier
+
+from auth_metrics import VerifyMetrics
+from auth_token_cache import RejectedTokenCache, VerifiedTokenCache
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class IntrospectionTokenVerifier(TokenVerifier):
+    """introspection_endpoint に問い合わせて active なトークンだけを受け付ける。
+
+    - audience: 指定したときは aud にこの値が含まれるトークンだけを受け付ける
+    - local: hybrid モードで使うローカルのJWT検証（JWTはこちらで検証し、問い合わせない）
+    """
+
+    def __init__(
+        self,
+        introspection_endpoint: str,
+        client_id: str,
+        client_secret: str = "",
+        required_scopes: list[str] | None = None,
+        audience: str | None = None,
+        positive_ttl: float = 30.0,
+        negative_ttl: float = 5.0,
+        max_entries: int = 4096,
+        max_connections: int = 20,
+        timeout: float = 10.0,
+        local: TokenVerifier | None = None,
+        metrics: VerifyMetrics | None = None,
+    ) -> None:
+        self.introspection_endpoint = introspection_endpoint
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.required_scopes = required_scopes or []
+        self.audience = audience
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.local = local
+        self.metrics = metrics or VerifyMetrics()
+        self.token_cache = VerifiedTokenCache(max_entries, max_ttl=positive_ttl)
+        self.rejected = RejectedTokenCache(max_entries, ttl=negative_ttl)
+        self.introspections = 0
+        self.errors = 0
+        self.local_verified = 0
+        self._inflight: SingleFlight[AccessToken | None] = SingleFlight()
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def verify_token(self, token: str) -> AccessToken | None:
+        if self.local is not None and _is_jwt(token):
+            self.local_verified += 1
+            return await self.local.verify_token(token)
+
+        cached = self.token_cache.get(token)
+        if cached is not None:
+            self.metrics.count("cached")
+            return cached
+        if token in self.rejected:
+            self.metrics.count("cached_rejected")
+            return None
+        # 同じトークンで同時に来たリクエストは1回の問い合わせの結果を待つ
+        return await self._inflight.do(VerifiedTokenCache.key_of(token).hex(), lambda: self._introspect(token))
+
+    async def _introspect(self, token: str) -> AccessToken | None:
+        self.introspections += 1
+        started = self.metrics.start()
+        t0 = time.perf_counter()
+        data = {"token": token, "client_id": self.client_id}
+        if self.client_secret:
+            data["client_secret"] = self.client_secret
+        try:
+            r = await self.client.post(self.introspection_endpoint, data=data)
+            r.raise_for_status()
+            result: dict[str, Any] = r.json()
+        except (httpx.HTTPError, ValueError) as e:
+            # Keycloak側の一時的な障害なので無効としてはキャッシュしない
+            self.errors += 1
+            self.metrics.count("error")
+            logger.warning("token introspection failed: %s", e)
+            return None
+        finally:
+            self.metrics.observe("introspection", started)
+
+        access_token = self._access_token_from(token, result)
+        if access_token is None:
+            self.rejected.add(token)
+            self.metrics.count("rejected")
+        else:
+            self.token_cache.put(token, access_token, cost=time.perf_counter() - t0)
+            self.metrics.count("verified")
+        return access_token
+
+    def _access_token_from(self, token: str, result: dict[str, Any]) -> AccessToken | None:
+        if not result.get("active"):
+            logger.debug("token rejected: inactive")
+            return None
+
+        scopes = [s for s in (result.get("scope") or "").split(" ") if s]
+        if any(req not in scopes for req in self.required_scopes):
+            logger.debug("token rejected: scopes %s do not include %s", scopes, self.required_scopes)
+            return None
+
+        aud = result.get("aud")
+        audiences = aud if isinstance(aud, list) else [aud] if aud else []
+        if self.audience is not None and self.audience not in audiences:
+            logger.debug("token rejected: audience %s does not include %s", audiences, self.audience)
+            return None
+
+        exp = result.get("exp")
+        return AccessToken(
+            token=token,
+            client_id=str(result.get("client_id") or result.get("azp") or "unknown-client"),
+            scopes=scopes,
+            expires_at=int(exp) if isinstance(exp, int) else None,
+        )
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "introspections": self.introspections,
+            "errors": self.errors,
+            "local_verified": self.local_verified,
+            "token_cache": self.token_cache.snapshot(),
+            "rejected_cache": self.rejected.snapshot(),
+            "inflight": self._inflight.snapshot(),
+        }
+
+
+def _is_jwt(token: str) -> bool:
+    try:
+        jwt.get_unverified_header(token)
+    except jwt.DecodeError:
+        return False
+    return True
@@ -0,0 +1,139 @@
+# KeycloakのJWKS（署名検証用の公開鍵セット）を非同期に取得し、kidごとに保持する
+# - 取得は httpx.AsyncClient で行うので、イベントループをブロックしない
+# - Keycloakの鍵ローテーションより前にバックグラウンドで定期的に取り直す
+# - 未知の kid が来たら取り直すが、同時に何件来ても1回にまとめ、最短間隔も守る
+import asyncio
+import contextlib
+import logging
+import re
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import httpx
+import jwt
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class JWKSStore:
+    """jwks_uri の鍵を kid をキーにした辞書で持つ。
+
+    - refresh_interval: 定期的に取り直す間隔（秒）。Cache-Control の max-age が短ければそちらを使う
+    - min_refetch_interval: 未知の kid による取り直しの最短間隔（秒）。取得に失敗したときの再試行間隔にも使う
+    - on_update: 取得に成功するたびにJWKSのJSONを渡して呼ぶ（ディスクへの保存など）
+    """
+
+    def __init__(
+        self,
+        jwks_uri: str,
+        client: httpx.AsyncClient,
+        refresh_interval: float = 300.0,
+        min_refetch_interval: float = 10.0,
+        on_update: Callable[[dict[str, Any]], Awaitable[None]] | None = None,
+    ) -> None:
+        self.jwks_uri = jwks_uri
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.min_refetch_interval = min_refetch_interval
+        self.on_update = on_update
+        self.keys: dict[str, jwt.PyJWK] = {}
+        # 別プロセスで検証するときに渡すJWKのJSON（PyJWK はプロセス間で渡せないため）
+        self.jwk_data: dict[str, dict[str, Any]] = {}
+        self.fetched_at: float | None = None
+        # 最後に取得を試みた時刻（失敗しても更新する）
+        self.attempted_at: float | None = None
+        self.next_refresh = refresh_interval
+        self.fetches = 0
+        self.unknown_kid = 0
+        self.rate_limited = 0
+        self._inflight: SingleFlight[None] = SingleFlight()
+        self._task: asyncio.Task[None] | None = None
+
+    def load(self, jwks: dict[str, Any]) -> None:
+        """JWKSのJSONから署名に使える鍵だけを取り込む。"""
+        keys = {}
+        jwk_data = {}
+        for data in jwks.get("keys", []):
+            # Keycloakは暗号化用（use=enc）の鍵も公開しているので除く
+            if data.get("use", "sig") != "sig" or "kid" not in data:
+                continue
+            try:
+                keys[data["kid"]] = jwt.PyJWK(data)
+                jwk_data[data["kid"]] = data
+            except jwt.PyJWKError as e:
+                logger.debug("skip unusable JWK %s: %s", data.get("kid"), e)
+        self.keys, self.jwk_data = keys, jwk_data
+        self.fetched_at = time.monotonic()
+
+    async def refresh(self) -> None:
+        """JWKSを取り直す。同時に呼ばれても取得は1回にまとめる。"""
+        await self._inflight.do(self.jwks_uri, self._fetch)
+
+    async def _fetch(self) -> None:
+        self.fetches += 1
+        self.attempted_at = time.monotonic()
+        r = await self.client.get(self.jwks_uri)
+        r.raise_for_status()
+        jwks = r.json()
+        self.load(jwks)
+        if self.on_update is not None:
+            await self.on_update(jwks)
+        match = _MAX_AGE.search(r.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else 0
+        self.next_refresh = min(self.refresh_interval, max_age) if max_age > 0 else self.refresh_interval
+
+    async def get_key(self, kid: str | None) -> jwt.PyJWK | None:
+        if kid is None:
+            # kid のないトークンは鍵が1つだけのときに限り受け付ける
+            return next(iter(self.keys.values())) if len(self.keys) == 1 else None
+        key = self.keys.get(kid)
+        if key is not None:
+            return key
+
+        # 鍵がローテーションされた可能性があるので取り直す。ただし間隔を空けずに何度も取りには行かない
+        # （JWKSエンドポイントが失敗し続けている間も、試みた時刻から間隔を空ける）
+        self.unknown_kid += 1
+        if self.attempted_at is not None and time.monotonic() - self.attempted_at < self.min_refetch_interval:
+            self.rate_limited += 1
+            return None
+        try:
+            await self.refresh()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("JWKS refetch failed: %s", e)
+            return None
+        return self.keys.get(kid)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.next_refresh)
+            try:
+                await self.refresh()
+            except (httpx.HTTPError, ValueError) as e:
+                # 取得に失敗しても手元の鍵で検証を続け、少し間を空けて再試行する
+                logger.warning("JWKS refresh failed: %s", e)
+                self.next_refresh = self.min_refetch_interval
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "kids": sorted(self.keys),
+            "age": round(time.monotonic() - self.fetched_at, 3) if self.fetched_at is not None else None,
+            "fetches": self.fetches,
+            "unknown_kid": self.unknown_kid,
+            "rate_limited": self.rate_limited,
+        }
@@ -0,0 +1,163 @@
+# auth_server.py の負荷試験。Keycloakの代わりに auth_oidc_stub.py のスタブを使う
+#
+# auth_server.py を認証なし（off）と認証あり（on）で順に起動し、
+# 並列のMCPセッションから calculator_sum を呼んでスループットとレイテンシを比べる
+#   uv run python auth_load_bench.py --requests 2000 --concurrency 16
+#   uv run python auth_load_bench.py --alg ES256 --server-env AUTH_TOKEN_CACHE_MAX_ENTRIES=0
+#   uv run python auth_load_bench.py --runs on --server-env AUTH_VERIFY_MODE=introspection
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+from mcp import ClientSession
+from mcp.client.streamable_http import streamable_http_client
+
+from auth_oidc_stub import STUB_HOST, STUB_PORT, OIDCStub
+from bench_stats import report
+
+AUTH_SERVER = Path(__file__).resolve().parent / "auth_server.py"
+SERVER_PORT = 8100
+
+_STAGE_LINE = re.compile(r'^mcp_auth_verify_stage_seconds_(sum|count)\{stage="(\w+)"\} (\S+)$')
+
+
+async def get_access_token(client: httpx.AsyncClient, stub: OIDCStub) -> str:
+    r = await client.post(
+        f"{stub.issuer}/protocol/openid-connect/token",
+        data={
+            "grant_type": "client_credentials",
+            "client_id": stub.client_id,
+            "client_secret": stub.client_secret,
+            "scope": "mcp:tools",
+        },
+    )
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def start_server(args: argparse.Namespace, stub: OIDCStub, auth: bool, errlog) -> asyncio.subprocess.Process:
+    env = {
+        **os.environ,
+        "KEYCLOAK_ISSUER": stub.issuer,
+        "AUTH_SERVER_PORT": str(args.port),
+        "AUTH_ENABLED": "1" if auth else "0",
+        "AUTH_OIDC_CACHE": "",
+        "AUTH_INTROSPECTION_CLIENT_ID": stub.client_id,
+        "AUTH_INTROSPECTION_CLIENT_SECRET": stub.client_secret,
+        **dict(item.split("=", 1) for item in args.server_env),
+    }
+    process = await asyncio.create_subprocess_exec(sys.executable, str(AUTH_SERVER), env=env, stdout=errlog, stderr=errlog)
+    async with httpx.AsyncClient() as client:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"http://127.0.0.1:{args.port}/metrics")).status_code == 200:
+                    return process
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    process.kill()
+    raise RuntimeError("auth_server.py did not start")
+
+
+async def measure(args: argparse.Namespace, tokens: list[str | None]) -> tuple[list[float], int, float]:
+    """セッションごとに calculator_sum を呼び続け、合計 args.requests 回のレイテンシを返す。"""
+    samples: list[float] = []
+    errors = 0
+    remaining = args.requests
+    url = f"http://127.0.0.1:{args.port}/mcp"
+
+    async def worker(token: str | None) -> None:
+        nonlocal remaining, errors
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        async with httpx.AsyncClient(headers=headers, timeout=30) as http_client:
+            async with streamable_http_client(url, http_client=http_client) as (read, write, _):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    while remaining > 0:
+                        remaining -= 1
+                        t0 = time.perf_counter()
+                        result = await session.call_tool("calculator_sum", {"numbers": [1, 2, 3]})
+                        samples.append(time.perf_counter() - t0)
+                        errors += result.isError
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(token) for token in tokens))
+    return samples, errors, time.perf_counter() - start
+
+
+async def print_verify_stages(port: int) -> None:
+    """auth_server.py の /metrics から検証の段階ごとの平均時間を表示する。"""
+    async with httpx.AsyncClient() as client:
+        text = (await client.get(f"http://127.0.0.1:{port}/metrics")).text
+    totals: dict[str, dict[str, float]] = {}
+    for line in text.splitlines():
+        if match := _STAGE_LINE.match(line):
+            kind, stage, value = match.groups()
+            totals.setdefault(stage, {})[kind] = float(value)
+    for stage, values in totals.items():
+        if values.get("count"):
+            print(f"{'':>14}{stage}: n={int(values['count'])} mean={values['sum'] / values['count'] * 1000:.3f}ms")
+
+
+async def run(args: argparse.Namespace, stub: OIDCStub, auth: bool) -> float:
+    with open(args.server_log, "a") as errlog:
+        process = await start_server(args, stub, auth, errlog)
+        try:
+            async with httpx.AsyncClient() as client:
+                if not auth:
+                    tokens: list[str | None] = [None] * args.concurrency
+                elif args.shared_token:
+                    tokens = [await get_access_token(client, stub)] * args.concurrency
+                else:
+                    tokens = [await get_access_token(client, stub) for _ in range(args.concurrency)]
+            samples, errors, elapsed = await measure(args, tokens)
+            label = f"auth-{'on' if auth else 'off'}"
+            report(label, samples, elapsed)
+            print(f"{'':>14}errors={errors}")
+            if auth:
+                await print_verify_stages(args.port)
+            return len(samples) / elapsed
+        finally:
+            process.terminate()
+            await process.wait()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="auth_server.py load test")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8, help="並列のMCPセッション数")
+    parser.add_argument("--runs", default="off,on", help="実行する順番（off: 認証なし, on: 認証あり）")
+    parser.add_argument("--alg", choices=["RS256", "ES256"], default="RS256")
+    parser.add_argument("--shared-token", action="store_true", help="全セッションで同じトークンを使う")
+    parser.add_argument("--latency", type=float, default=0.0, help="OIDCスタブが各リクエストに加える遅延（秒）")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="auth_server.py を起動するポート")
+    parser.add_argument("--stub-port", type=int, default=STUB_PORT)
+    parser.add_argument("--server-env", action="append", default=[], help="auth_server.py に渡す環境変数（KEY=VALUE）")
+    parser.add_argument("--server-log", default=os.devnull, help="auth_server.py の出力の書き込み先")
+    args = parser.parse_args()
+
+    stub = OIDCStub(f"http://{STUB_HOST}:{args.stub_port}", alg=args.alg, latency=args.latency)
+    server = uvicorn.Server(uvicorn.Config(stub.app(), host=STUB_HOST, port=args.stub_port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    try:
+        rps = {mode: await run(args, stub, mode == "on") for mode in args.runs.split(",")}
+        if "on" in rps and "off" in rps:
+            print(f"auth overhead: {(1 - rps['on'] / rps['off']) * 100:.1f}% throughput")
+        print("oidc stub requests:", dict(stub.request_counts))
+    finally:
+        server.should_exit = True
+        await serve_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
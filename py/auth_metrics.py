@@ -0,0 +1,96 @@
+# トークン検証の段階ごとの所要時間をヒストグラムで記録する
+# 無効にしたときは start() が 0.0 を返し observe() がすぐ戻るだけなので、検証のコストはほぼ増えない
+import bisect
+import time
+from typing import Any
+
+# バケットの上限（秒）。Prometheus のヒストグラムと同じく「以下」で数える
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float | None:
+        """q が入るバケットの上限を返す（最後のバケットなら最大のバケット上限）。"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict[str, Any]:
+        def ms(value: float | None) -> float | None:
+            return round(value * 1000, 3) if value is not None else None
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99)),
+        }
+
+
+class VerifyMetrics:
+    """段階（discovery / key_lookup / signature / claims / total）ごとのヒストグラムと、結果ごとの件数。"""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.stages: dict[str, Histogram] = {}
+        self.outcomes: dict[str, int] = {}
+
+    def start(self) -> float:
+        return time.perf_counter() if self.enabled else 0.0
+
+    def observe(self, stage: str, started: float) -> None:
+        if not self.enabled:
+            return
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(time.perf_counter() - started)
+
+    def count(self, outcome: str) -> None:
+        if self.enabled:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "stages": {stage: histogram.snapshot() for stage, histogram in self.stages.items()},
+            "outcomes": dict(self.outcomes),
+        }
+
+    def render_prometheus(self, prefix: str = "mcp_auth") -> str:
+        """Prometheus のテキスト形式で出力する。"""
+        lines = [
+            f"# HELP {prefix}_verify_stage_seconds Token verification latency by stage.",
+            f"# TYPE {prefix}_verify_stage_seconds histogram",
+        ]
+        for stage, histogram in self.stages.items():
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, float("inf")), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{prefix}_verify_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_verify_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'{prefix}_verify_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines.append(f"# HELP {prefix}_verify_total Token verification results.")
+        lines.append(f"# TYPE {prefix}_verify_total counter")
+        for outcome, count in self.outcomes.items():
+            lines.append(f'{prefix}_verify_total{{outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
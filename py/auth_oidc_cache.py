@@ -0,0 +1,43 @@
+# 最後に取得できたOIDCディスカバリー文書とJWKSをディスクに保存する
+# 再起動時にKeycloakへの問い合わせを待たずに検証を始められ、Keycloakが一時的に
+# 落ちていても保存済みの鍵で検証を続けられる
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class OIDCMetadataCache:
+    """ディスカバリー文書とJWKSを1つのJSONファイルに保存する。"""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+
+    def load(self) -> tuple[dict[str, Any], dict[str, Any]] | None:
+        """保存済みの (ディスカバリー文書, JWKS) を返す。ないか壊れていれば None。"""
+        try:
+            data = json.loads(self.path.read_text())
+            return data["discovery"], data["jwks"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("ignore broken OIDC metadata cache %s: %s", self.path, e)
+            return None
+
+    async def save(self, discovery: dict[str, Any], jwks: dict[str, Any]) -> None:
+        data = {"discovery": discovery, "jwks": jwks, "saved_at": time.time()}
+        try:
+            await asyncio.to_thread(self._write, json.dumps(data))
+        except OSError as e:
+            logger.warning("failed to save OIDC metadata cache %s: %s", self.path, e)
+
+    def _write(self, text: str) -> None:
+        # 書き込み途中のファイルを読まれないよう、一時ファイルに書いてから置き換える
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        tmp.write_text(text)
+        os.replace(tmp, self.path)
@@ -0,0 +1,183 @@
+# 負荷試験用のOIDCプロバイダー（Keycloak）スタブサーバー
+# ローカルで生成した鍵でRS256/ES256のアクセストークンを発行する
+# auth_server.py を KEYCLOAK_ISSUER=http://127.0.0.1:8180/realms/master で起動するとKeycloakの代わりに使える
+#   uv run python auth_oidc_stub.py --port 8180 --alg ES256
+#
+# 提供するエンドポイント（Keycloakと同じパス）
+#   /realms/{realm}/.well-known/openid-configuration
+#   /realms/{realm}/protocol/openid-connect/certs              JWKS
+#   /realms/{realm}/protocol/openid-connect/token              client_credentials
+#   /realms/{realm}/protocol/openid-connect/token/introspect   RFC 7662
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter
+from typing import Any
+
+import jwt
+import uvicorn
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8180
+STUB_REALM = "master"
+STUB_CLIENT_ID = "mcp-client"
+STUB_CLIENT_SECRET = "mcp-secret"
+
+
+class OIDCStub:
+    """ディスカバリー、JWKS、トークン発行、イントロスペクションを返すスタブ。
+
+    - alg: 発行するトークンの署名アルゴリズム（RS256 / ES256）。JWKSには両方の鍵を載せる
+    - expires_in: 発行するトークンの有効期間（秒）
+    - latency: 各リクエストに加える遅延（秒）
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        realm: str = STUB_REALM,
+        alg: str = "RS256",
+        expires_in: int = 300,
+        latency: float = 0.0,
+        client_id: str = STUB_CLIENT_ID,
+        client_secret: str = STUB_CLIENT_SECRET,
+    ) -> None:
+        self.issuer = f"{base_url}/realms/{realm}"
+        self.alg = alg
+        self.expires_in = expires_in
+        self.latency = latency
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.keys: dict[str, Any] = {
+            "RS256": rsa.generate_private_key(public_exponent=65537, key_size=2048),
+            "ES256": ec.generate_private_key(ec.SECP256R1()),
+        }
+        self.request_counts: Counter[str] = Counter()
+
+    @staticmethod
+    def kid(alg: str) -> str:
+        return f"stub-{alg.lower()}"
+
+    def jwks(self) -> dict[str, Any]:
+        keys = []
+        for alg, private_key in self.keys.items():
+            algorithm = jwt.algorithms.RSAAlgorithm if alg == "RS256" else jwt.algorithms.ECAlgorithm
+            jwk = json.loads(algorithm.to_jwk(private_key.public_key()))
+            jwk.update(kid=self.kid(alg), use="sig", alg=alg)
+            keys.append(jwk)
+        return {"keys": keys}
+
+    def mint(self, scope: str = "mcp:tools", alg: str | None = None, expires_in: int | None = None) -> str:
+        """アクセストークンを発行する。"""
+        alg = alg or self.alg
+        now = int(time.time())
+        claims = {
+            "iss": self.issuer,
+            "aud": "account",
+            "azp": self.client_id,
+            "scope": scope,
+            "iat": now,
+            "exp": now + (expires_in or self.expires_in),
+            "jti": str(uuid.uuid4()),
+        }
+        return jwt.encode(claims, self.keys[alg], algorithm=alg, headers={"kid": self.kid(alg)})
+
+    async def _admit(self, kind: str) -> None:
+        self.request_counts[kind] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def discovery(self, request: Request) -> Response:
+        await self._admit("discovery")
+        endpoint = f"{self.issuer}/protocol/openid-connect"
+        return JSONResponse({
+            "issuer": self.issuer,
+            "jwks_uri": f"{endpoint}/certs",
+            "token_endpoint": f"{endpoint}/token",
+            "introspection_endpoint": f"{endpoint}/token/introspect",
+            "grant_types_supported": ["client_credentials"],
+            "id_token_signing_alg_values_supported": list(self.keys),
+        })
+
+    async def certs(self, request: Request) -> Response:
+        await self._admit("jwks")
+        return JSONResponse(self.jwks())
+
+    def _client_authenticated(self, form: dict[str, Any]) -> bool:
+        return form.get("client_id") == self.client_id and form.get("client_secret") == self.client_secret
+
+    async def token(self, request: Request) -> Response:
+        await self._admit("token")
+        form = dict(await request.form())
+        if form.get("grant_type") != "client_credentials":
+            return JSONResponse({"error": "unsupported_grant_type"}, status_code=400)
+        if not self._client_authenticated(form):
+            return JSONResponse({"error": "invalid_client"}, status_code=401)
+        scope = str(form.get("scope") or "mcp:tools")
+        return JSONResponse({
+            "access_token": self.mint(scope),
+            "token_type": "Bearer",
+            "expires_in": self.expires_in,
+            "scope": scope,
+        })
+
+    async def introspect(self, request: Request) -> Response:
+        await self._admit("introspect")
+        form = dict(await request.form())
+        try:
+            header = jwt.get_unverified_header(str(form.get("token", "")))
+            alg = header.get("alg", "")
+            claims = jwt.decode(
+                str(form["token"]),
+                self.keys[alg].public_key(),
+                algorithms=[alg],
+                audience="account",
+                issuer=self.issuer,
+            )
+        except (jwt.InvalidTokenError, KeyError):
+            return JSONResponse({"active": False})
+        return JSONResponse({"active": True, "client_id": claims["azp"], **claims})
+
+    async def stats(self, request: Request) -> JSONResponse:
+        return JSONResponse(dict(self.request_counts))
+
+    def app(self) -> Starlette:
+        prefix = "/realms/{realm}"
+        return Starlette(routes=[
+            Route("/__stats", self.stats),
+            Route(f"{prefix}/.well-known/openid-configuration", self.discovery),
+            Route(f"{prefix}/protocol/openid-connect/certs", self.certs),
+            Route(f"{prefix}/protocol/openid-connect/token", self.token, methods=["POST"]),
+            Route(f"{prefix}/protocol/openid-connect/token/introspect", self.introspect, methods=["POST"]),
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OIDC provider stub server")
+    parser.add_argument("--host", default=STUB_HOST)
+    parser.add_argument("--port", type=int, default=STUB_PORT)
+    parser.add_argument("--realm", default=STUB_REALM)
+    parser.add_argument("--alg", choices=["RS256", "ES256"], default="RS256")
+    parser.add_argument("--expires-in", type=int, default=300, help="発行するトークンの有効期間（秒）")
+    parser.add_argument("--latency", type=float, default=0.0, help="各リクエストに加える遅延（秒）")
+    args = parser.parse_args()
+    stub = OIDCStub(
+        f"http://{args.host}:{args.port}",
+        realm=args.realm,
+        alg=args.alg,
+        expires_in=args.expires_in,
+        latency=args.latency,
+    )
+    print(f"issuer: {stub.issuer}  client_id={stub.client_id} client_secret={stub.client_secret}")
+    uvicorn.run(stub.app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
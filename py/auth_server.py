@@ -1,15 +1,28 @@
 import httpx
 import jwt
-from jwt import PyJWKClient
 from mcp.server.fastmcp import FastMCP, Context
 from mcp.server.fastmcp.utilities.logging import get_logger
 from mcp.server.auth.provider import AccessToken, TokenVerifier
 from mcp.server.auth.settings import AuthSettings
 from dataclasses import dataclass
 from pydantic import AnyHttpUrl
-from typing import Any
+from typing import Any, cast
+import contextlib
+import json
+import os
 import time
+import uvicorn
 from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+from auth_introspection import IntrospectionTokenVerifier
+from auth_jwks import JWKSStore
+from auth_metrics import VerifyMetrics
+from auth_oidc_cache import OIDCMetadataCache
+from auth_signature_pool import DecodeJob, ExecutorMode, SignatureVerifierPool
+from auth_token_cache import VerifiedTokenCache
+from singleflight import SingleFlight
 
 logger = get_logger("FastMCP.Server")
 
@@ -27,81 +40,188 @@ class KeycloakJWTVerifier(TokenVerifier):
     """
     Verify Keycloak-issued JWT access tokens using OIDC discovery + JWKS.
     - Fetches {issuer}/.well-known/openid-configuration (OIDC discovery)
-    - Uses jwks_uri to validate token signature
+    - Uses jwks_uri to validate token signature (keys are fetched asynchronously and indexed by kid)
     - Validates issuer and required scopes
+    - Caches verified tokens until exp so repeated requests skip the signature check
+    - Loads discovery + JWKS eagerly at startup and persists the last-known copy to disk
     """
 
-    def __init__(self, issuer_url: str, required_scopes: list[str] | None = None) -> None:
+    def __init__(
+        self,
+        issuer_url: str,
+        required_scopes: list[str] | None = None,
+        token_cache: VerifiedTokenCache | None = None,
+        jwks_refresh_interval: float = 300.0,
+        jwks_min_refetch_interval: float = 10.0,
+        metadata_cache: OIDCMetadataCache | None = None,
+        signatures: SignatureVerifierPool | None = None,
+        metrics: VerifyMetrics | None = None,
+    ) -> None:
         self.issuer_url = issuer_url.rstrip("/")
         self.required_scopes = required_scopes or []
+        self.token_cache = token_cache or VerifiedTokenCache()
+        self.jwks_refresh_interval = jwks_refresh_interval
+        self.jwks_min_refetch_interval = jwks_min_refetch_interval
+        self.metadata_cache = metadata_cache
+        self.signatures = signatures or SignatureVerifierPool()
+        self.metrics = metrics or VerifyMetrics()
         self._meta: KeycloakOIDCMetadata | None = None
-        self._jwk_client: PyJWKClient | None = None
+        self._discovery_document: dict[str, Any] | None = None
+        self._discovery: SingleFlight[KeycloakOIDCMetadata] = SingleFlight()
+        self._client: httpx.AsyncClient | None = None
+        self.jwks: JWKSStore | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10)
+        return self._client
+
+    async def start(self) -> None:
+        """サーバー起動時にディスカバリーとJWKSを読み込み、最初のリクエストを待たせないようにする。
+
+        保存済みのものがあればそれで検証を始め、最新のJWKSはバックグラウンドで取り直す。
+        """
+        saved = self.metadata_cache.load() if self.metadata_cache is not None else None
+        # 設定したissuerと違うものが保存されていたら使わない
+        if saved is not None and saved[0].get("issuer", "").rstrip("/") != self.issuer_url:
+            saved = None
+        if saved is not None and self._meta is None:
+            discovery, jwks = saved
+            self._install(discovery, jwks)
+            assert self.jwks is not None
+            self.jwks.next_refresh = 0
+            self.jwks.start()
+            return
+        try:
+            await self._load_metadata()
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            # Keycloakが起動していなくてもサーバーは起動し、最初のリクエストで再試行する
+            logger.warning("OIDC discovery failed at startup: %s", e)
 
     async def _load_metadata(self) -> KeycloakOIDCMetadata:
         if self._meta is not None:
             return self._meta
+        # 起動直後に同時に来たリクエストがそれぞれディスカバリーを取りに行かないよう1回にまとめる
+        return await self._discovery.do(self.issuer_url, self._discover)
 
+    async def _discover(self) -> KeycloakOIDCMetadata:
         # Keycloak OIDC discovery endpoint pattern is shown in MCP auth tutorial
         # e.g. http://localhost:8080/realms/master/.well-known/openid-configuration
         discovery = f"{self.issuer_url}/.well-known/openid-configuration"
-        async with httpx.AsyncClient(timeout=10) as client:
-            r = await client.get(discovery)
-            logger.info(discovery)
-            logger.info(r)
-            r.raise_for_status()
-            data = r.json()
-
-        self._meta = KeycloakOIDCMetadata(
-            issuer=data["issuer"],
-            jwks_uri=data["jwks_uri"],
+        r = await self.client.get(discovery)
+        logger.info("OIDC discovery %s: %s", discovery, r.status_code)
+        r.raise_for_status()
+
+        meta = self._install(r.json(), None)
+        assert self.jwks is not None
+        await self.jwks.refresh()
+        # 鍵のローテーションに備えてバックグラウンドで定期的に取り直す
+        self.jwks.start()
+        self._meta = meta
+        return meta
+
+    def _install(self, discovery: dict[str, Any], jwks: dict[str, Any] | None) -> KeycloakOIDCMetadata:
+        meta = KeycloakOIDCMetadata(
+            issuer=discovery["issuer"],
+            jwks_uri=discovery["jwks_uri"],
         )
-        logger.info(self._meta)
-        self._jwk_client = PyJWKClient(self._meta.jwks_uri)
-        return self._meta
+        logger.info("OIDC metadata: %s", meta)
+        self._discovery_document = discovery
+        store = JWKSStore(
+            meta.jwks_uri,
+            self.client,
+            refresh_interval=self.jwks_refresh_interval,
+            min_refetch_interval=self.jwks_min_refetch_interval,
+            on_update=self._save_metadata,
+        )
+        if jwks is not None:
+            store.load(jwks)
+            self._meta = meta
+        self.jwks = store
+        return meta
+
+    async def _save_metadata(self, jwks: dict[str, Any]) -> None:
+        if self.metadata_cache is not None and self._discovery_document is not None:
+            await self.metadata_cache.save(self._discovery_document, jwks)
+
+    async def aclose(self) -> None:
+        if self.jwks is not None:
+            await self.jwks.stop()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.signatures.shutdown()
 
     async def verify_token(self, token: str) -> AccessToken | None:
+        started = self.metrics.start()
+        cached = self.token_cache.get(token)
+        if cached is not None:
+            self.metrics.count("cached")
+            self.metrics.observe("total", started)
+            return cached
+
+        start = time.perf_counter()
+        access_token = await self._verify_token(token)
+        if access_token is not None:
+            self.token_cache.put(token, access_token, cost=time.perf_counter() - start)
+        self.metrics.observe("total", started)
+        return access_token
+
+    async def _verify_token(self, token: str) -> AccessToken | None:
+        started = self.metrics.start()
         meta = await self._load_metadata()
-        assert self._jwk_client is not None
+        assert self.jwks is not None
+        self.metrics.observe("discovery", started)
 
         try:
-            signing_key = self._jwk_client.get_signing_key_from_jwt(token).key
-            logger.info(f'verify...{signing_key}')
-            unverified = jwt.decode(token, options={"verify_signature": False})
-            logger.info(unverified.get("aud"))
-            logger.info(unverified.get("azp"))
-            logger.info(unverified.get("scope"))
+            started = self.metrics.start()
+            jwk = await self.jwks.get_key(jwt.get_unverified_header(token).get("kid"))
+            self.metrics.observe("key_lookup", started)
+            if jwk is None:
+                self.metrics.count("unknown_kid")
+                logger.debug("token rejected: unknown kid")
+                return None
 
             # Validate signature + issuer; audience validation is optional and depends on your token config.
-            claims: dict[str, Any] = jwt.decode(
-                token,
-                signing_key,
-                algorithms=["RS256", "ES256"],  # Keycloak commonly uses RS256; ES256 also possible.
-                issuer=meta.issuer,
-                options={
-                    "require": ["exp", "iss"],
-                },
-                audience="account",
+            # 署名検証はCPUを使うので、設定に応じてスレッド/プロセスプールで実行する
+            started = self.metrics.start()
+            claims: dict[str, Any] = await self.signatures.decode(
+                DecodeJob(
+                    token,
+                    self.jwks.jwk_data[jwk.key_id],
+                    issuer=meta.issuer,
+                    audience="account",
+                    algorithms=("RS256", "ES256"),  # Keycloak commonly uses RS256; ES256 also possible.
+                )
             )
+            self.metrics.observe("signature", started)
         except Exception as e:
-            logger.info(f'verify...error {e}')
+            self.metrics.count("invalid")
+            logger.debug("token rejected: %s", e)
             return None
-        logger.info('verify...2')
+
+        started = self.metrics.start()
+        access_token = self._access_token_from_claims(token, claims)
+        self.metrics.observe("claims", started)
+        self.metrics.count("verified" if access_token is not None else "rejected_claims")
+        return access_token
+
+    def _access_token_from_claims(self, token: str, claims: dict[str, Any]) -> AccessToken | None:
         # Keycloak "scope" claim is typically a space-separated string for OAuth2 access tokens.
         scope_str = claims.get("scope", "") or ""
         scopes = [s for s in scope_str.split(" ") if s]
 
         if any(req not in scopes for req in self.required_scopes):
-            logger.info(scopes)
-            logger.info(self.required_scopes)
+            logger.debug("token rejected: scopes %s do not include %s", scopes, self.required_scopes)
             return None
 
-        logger.info('verify...3')
         exp = claims.get("exp")
         if isinstance(exp, int) and exp < int(time.time()):
             return None
 
-        logger.info('verify...4')
         client_id = claims.get("azp") or claims.get("client_id") or "unknown-client"
+        logger.debug("token verified: azp=%s aud=%s", client_id, claims.get("aud"))
 
         return AccessToken(
             token=token,
@@ -111,22 +231,83 @@ class KeycloakJWTVerifier(TokenVerifier):
             # resource=...  # (RFC8707 resource indicator) 使うならここに入れる
         )
 
-KEYCLOAK_ISSUER = "http://localhost:8080/realms/master"
-RESOURCE_SERVER_URL = "http://localhost:8000"
+KEYCLOAK_ISSUER = os.getenv("KEYCLOAK_ISSUER", "http://localhost:8080/realms/master")
+AUTH_SERVER_PORT = int(os.getenv("AUTH_SERVER_PORT", "8000"))
+RESOURCE_SERVER_URL = f"http://localhost:{AUTH_SERVER_PORT}"
+# 0 にすると認証なしで起動する（負荷試験で認証のオーバーヘッドを切り分けるため）
+AUTH_ENABLED = os.getenv("AUTH_ENABLED", "1") == "1"
 REQUIRED_SCOPES = ["mcp:tools"]
-verifier = KeycloakJWTVerifier(KEYCLOAK_ISSUER, required_scopes=REQUIRED_SCOPES)
+# 検証済みトークンのキャッシュ（件数の上限と、exp より前に捨てるまでの最大秒数）
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "1024"))
+AUTH_TOKEN_CACHE_MAX_TTL = float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL", "300"))
+# JWKSを定期的に取り直す間隔と、未知の kid で取り直すときの最短間隔（秒）
+AUTH_JWKS_REFRESH_INTERVAL = float(os.getenv("AUTH_JWKS_REFRESH_INTERVAL", "300"))
+AUTH_JWKS_MIN_REFETCH_INTERVAL = float(os.getenv("AUTH_JWKS_MIN_REFETCH_INTERVAL", "10"))
+# 最後に取得したディスカバリー文書とJWKSの保存先（空文字なら保存しない）
+AUTH_OIDC_CACHE = os.getenv("AUTH_OIDC_CACHE", "auth_oidc_cache.json")
+# 署名検証の実行場所（inline / thread / process）とワーカー数、まとめて渡す件数と待ち時間（秒）
+AUTH_VERIFY_EXECUTOR = cast(ExecutorMode, os.getenv("AUTH_VERIFY_EXECUTOR", "inline"))
+AUTH_VERIFY_WORKERS = int(os.getenv("AUTH_VERIFY_WORKERS") or 0) or None
+AUTH_VERIFY_BATCH_MAX = int(os.getenv("AUTH_VERIFY_BATCH_MAX", "32"))
+AUTH_VERIFY_BATCH_WINDOW = float(os.getenv("AUTH_VERIFY_BATCH_WINDOW", "0"))
+# 検証の段階ごとの所要時間を記録するか（/metrics と auth://stats で参照できる）
+AUTH_METRICS = os.getenv("AUTH_METRICS", "1") == "1"
+verifier = KeycloakJWTVerifier(
+    KEYCLOAK_ISSUER,
+    required_scopes=REQUIRED_SCOPES,
+    token_cache=VerifiedTokenCache(AUTH_TOKEN_CACHE_MAX_ENTRIES, AUTH_TOKEN_CACHE_MAX_TTL),
+    jwks_refresh_interval=AUTH_JWKS_REFRESH_INTERVAL,
+    jwks_min_refetch_interval=AUTH_JWKS_MIN_REFETCH_INTERVAL,
+    metadata_cache=OIDCMetadataCache(AUTH_OIDC_CACHE) if AUTH_OIDC_CACHE else None,
+    signatures=SignatureVerifierPool(
+        AUTH_VERIFY_EXECUTOR,
+        workers=AUTH_VERIFY_WORKERS,
+        max_batch=AUTH_VERIFY_BATCH_MAX,
+        batch_window=AUTH_VERIFY_BATCH_WINDOW,
+    ),
+    metrics=VerifyMetrics(AUTH_METRICS),
+)
+
+# トークンの検証方式
+#   jwt:           JWKSでローカルに検証する（既定）
+#   introspection: Keycloakのイントロスペクション（RFC 7662）で検証する。失効したトークンもすぐ拒否できる
+#   hybrid:        JWTはローカルで検証し、JWTでないトークンだけイントロスペクションで検証する
+AUTH_VERIFY_MODE = os.getenv("AUTH_VERIFY_MODE", "jwt")
+if AUTH_VERIFY_MODE not in ("jwt", "introspection", "hybrid"):
+    raise ValueError(f"unknown AUTH_VERIFY_MODE: {AUTH_VERIFY_MODE}")
+AUTH_INTROSPECTION_ENDPOINT = os.getenv(
+    "AUTH_INTROSPECTION_ENDPOINT", f"{KEYCLOAK_ISSUER}/protocol/openid-connect/token/introspect"
+)
+AUTH_INTROSPECTION_CLIENT_ID = os.getenv("AUTH_INTROSPECTION_CLIENT_ID", "mcp-server")
+AUTH_INTROSPECTION_CLIENT_SECRET = os.getenv("AUTH_INTROSPECTION_CLIENT_SECRET", "")
+# 有効/無効と判定した結果をキャッシュする秒数
+AUTH_INTROSPECTION_POSITIVE_TTL = float(os.getenv("AUTH_INTROSPECTION_POSITIVE_TTL", "30"))
+AUTH_INTROSPECTION_NEGATIVE_TTL = float(os.getenv("AUTH_INTROSPECTION_NEGATIVE_TTL", "5"))
+AUTH_INTROSPECTION_MAX_CONNECTIONS = int(os.getenv("AUTH_INTROSPECTION_MAX_CONNECTIONS", "20"))
+introspection_verifier = IntrospectionTokenVerifier(
+    AUTH_INTROSPECTION_ENDPOINT,
+    AUTH_INTROSPECTION_CLIENT_ID,
+    AUTH_INTROSPECTION_CLIENT_SECRET,
+    required_scopes=REQUIRED_SCOPES,
+    positive_ttl=AUTH_INTROSPECTION_POSITIVE_TTL,
+    negative_ttl=AUTH_INTROSPECTION_NEGATIVE_TTL,
+    max_connections=AUTH_INTROSPECTION_MAX_CONNECTIONS,
+    local=verifier if AUTH_VERIFY_MODE == "hybrid" else None,
+    metrics=VerifyMetrics(AUTH_METRICS),
+)
+token_verifier: TokenVerifier = verifier if AUTH_VERIFY_MODE == "jwt" else introspection_verifier
 
 
 mcp = FastMCP(
     "CalculatorAuthMCPServer",
     host="localhost",
-    port=8000,
-    token_verifier=verifier,
+    port=AUTH_SERVER_PORT,
+    token_verifier=token_verifier if AUTH_ENABLED else None,
     auth=AuthSettings(
         issuer_url=AnyHttpUrl(KEYCLOAK_ISSUER),
         resource_server_url=AnyHttpUrl(RESOURCE_SERVER_URL),
         required_scopes=REQUIRED_SCOPES,
-    ),
+    ) if AUTH_ENABLED else None,
 )
 
 @mcp.tool()
@@ -145,11 +326,49 @@ async def calculator_sum(numbers: list[float], ctx: Context) -> CalculatorResult
         total = total
     )
 
+@mcp.resource("auth://stats", mime_type="application/json")
+def get_auth_stats() -> str:
+    """トークン検証キャッシュのヒット率、JWKSの取得状況、検証の段階ごとのレイテンシ。"""
+    return json.dumps({
+        "token_cache": verifier.token_cache.snapshot(),
+        "jwks": verifier.jwks.snapshot() if verifier.jwks is not None else None,
+        "signatures": verifier.signatures.snapshot(),
+        "verify": verifier.metrics.snapshot(),
+        "mode": AUTH_VERIFY_MODE,
+        "introspection": introspection_verifier.snapshot() if AUTH_VERIFY_MODE != "jwt" else None,
+    })
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> Response:
+    """トークン検証の段階ごとのレイテンシ（Prometheus のテキスト形式）。"""
+    text = verifier.metrics.render_prometheus()
+    if AUTH_VERIFY_MODE != "jwt":
+        text += introspection_verifier.metrics.render_prometheus(prefix="mcp_auth_introspection")
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # 最初のリクエストより前にディスカバリーとJWKSを読み込んでおく
+    if AUTH_ENABLED and AUTH_VERIFY_MODE != "introspection":
+        await verifier.start()
+    try:
+        async with mcp.session_manager.run():
+            yield
+    finally:
+        await verifier.aclose()
+        await introspection_verifier.aclose()
+
+
 def main():
     logger.info('start main...')
     # FastMCP docs: transport="http" + host/port
     # Server endpoint will be: http://127.0.0.1:8000/mcp
-    mcp.run(transport="streamable-http")
+    # mcp.run(transport="streamable-http") と同じアプリを、起動時に verifier.start() を呼ぶ lifespan で動かす
+    app = mcp.streamable_http_app()
+    app.router.lifespan_context = lifespan
+    uvicorn.run(app, host=mcp.settings.host, port=mcp.settings.port, log_level=mcp.settings.log_level.lower())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,162 @@
+# JWTの署名検証（CPUを使う処理）をイベントループの外で実行する
+# - inline:  従来どおりイベントループ上で検証する
+# - thread:  スレッドプールで検証する（OpenSSLがGILを解放している間は並列に動く）
+# - process: プロセスプールで検証する（複数コアを使える）
+# 検証待ちが溜まったときは max_batch 件までまとめて1回でプールに渡し、受け渡しのコストを減らす
+import asyncio
+import contextlib
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Literal, get_args
+
+import jwt
+
+ExecutorMode = Literal["inline", "thread", "process"]
+
+
+@dataclass(frozen=True)
+class DecodeJob:
+    token: str
+    jwk: dict[str, Any]
+    issuer: str
+    audience: str
+    algorithms: tuple[str, ...]
+
+
+# ワーカーごとに JWK から作った鍵を使い回す（鍵の生成も軽くはないため）
+_keys: dict[str, jwt.PyJWK] = {}
+
+
+def _key_for(jwk: dict[str, Any]) -> jwt.PyJWK:
+    cache_key = f"{jwk.get('kid')}:{jwk.get('n') or jwk.get('x')}"
+    key = _keys.get(cache_key)
+    if key is None:
+        key = _keys[cache_key] = jwt.PyJWK(jwk)
+    return key
+
+
+def decode(job: DecodeJob) -> dict[str, Any]:
+    """署名・issuer・audience・exp を検証してクレームを返す。失敗したら jwt.InvalidTokenError を送出する。"""
+    key = _key_for(job.jwk)
+    # ヘッダーの alg は鍵の種類に合うものだけ許す（RSAの鍵に ES256 を指定したトークンなどは弾く）
+    return jwt.decode(
+        job.token,
+        key,
+        algorithms=[alg for alg in job.algorithms if alg == key.algorithm_name],
+        issuer=job.issuer,
+        options={"require": ["exp", "iss"]},
+        audience=job.audience,
+    )
+
+
+def decode_batch(jobs: list[DecodeJob]) -> list[tuple[dict[str, Any] | None, str | None]]:
+    """まとめて検証し、ジョブごとに (クレーム, エラーメッセージ) を返す。プロセス間で渡せるよう例外は文字列にする。
+
+    1件の検証で想定外の例外が出ても、同じバッチのほかのジョブは失敗させない。
+    """
+    results: list[tuple[dict[str, Any] | None, str | None]] = []
+    for job in jobs:
+        try:
+            results.append((decode(job), None))
+        except Exception as e:
+            results.append((None, str(e) or type(e).__name__))
+    return results
+
+
+class SignatureVerifierPool:
+    """検証ジョブを溜めてまとめてプールに渡す。
+
+    - workers: プールのワーカー数（省略時はCPUコア数）
+    - max_batch: 1回でプールに渡す最大件数（溜まったジョブはワーカー数で割ってから渡す）
+    - batch_window: 最初のジョブが来てからまとめて渡すまで待つ秒数（0なら同じイベントループの周回で来た分だけ）
+    """
+
+    def __init__(
+        self,
+        mode: ExecutorMode = "inline",
+        workers: int | None = None,
+        max_batch: int = 32,
+        batch_window: float = 0.0,
+    ) -> None:
+        if mode not in get_args(ExecutorMode):
+            raise ValueError(f"unknown executor mode: {mode}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window
+        self.batches = 0
+        self.jobs = 0
+        self._executor: Executor | None = None
+        self._pending: list[tuple[DecodeJob, asyncio.Future[dict[str, Any]]]] = []
+        self._flush_scheduled = False
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="jwt-verify")
+        return self._executor
+
+    async def decode(self, job: DecodeJob) -> dict[str, Any]:
+        self.jobs += 1
+        if self.mode == "inline":
+            return decode(job)
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[dict[str, Any]] = loop.create_future()
+        self._pending.append((job, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            if self.batch_window > 0:
+                loop.call_later(self.batch_window, self._flush)
+            else:
+                loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        # 溜まったジョブをワーカー数で割って渡し、全ワーカーで並列に検証する
+        size = min(self.max_batch, -(-len(self._pending) // self.workers))
+        while self._pending:
+            batch, self._pending = self._pending[:size], self._pending[size:]
+            self.batches += 1
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: list[tuple[DecodeJob, asyncio.Future[dict[str, Any]]]]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._get_executor(), decode_batch, [job for job, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), (claims, error) in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(jwt.InvalidTokenError(error))
+            else:
+                future.set_result(claims)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            with contextlib.suppress(Exception):
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers if self.mode != "inline" else 0,
+            "jobs": self.jobs,
+            "batches": self.batches,
+            "avg_batch": round(self.jobs / self.batches, 2) if self.batches else None,
+        }
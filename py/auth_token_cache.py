@@ -0,0 +1,128 @@
+# 検証済みアクセストークンのキャッシュ
+# クライアントは有効期限まで同じトークンを使い回すので、2回目以降は署名検証を省略できる
+# - キーはトークンそのものではなくSHA-256ハッシュ（メモリ上に生のトークンを残さない）
+# - exp（または max_ttl）に達したエントリは返さずに追い出す
+# - 件数上限を超えたら最も使われていないものから追い出す（LRU）
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from mcp.server.auth.provider import AccessToken
+
+
+@dataclass
+class _CachedToken:
+    access_token: AccessToken
+    expires_at: float
+    # 検証にかかった時間（秒）。ヒットしたときに節約できた時間として数える
+    cost: float
+
+
+@dataclass
+class TokenCacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evictions: int = 0
+    saved_seconds: float = 0.0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class VerifiedTokenCache:
+    """検証に成功したトークンの AccessToken を保持する。
+
+    - max_entries: 保持するトークン数の上限
+    - max_ttl: exp より前でもこの秒数で期限切れにする（失効したトークンを使い続けないため）
+    """
+
+    def __init__(self, max_entries: int = 1024, max_ttl: float = 300.0) -> None:
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.stats = TokenCacheStats()
+        self._entries: OrderedDict[bytes, _CachedToken] = OrderedDict()
+
+    @staticmethod
+    def key_of(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> AccessToken | None:
+        key = self.key_of(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        if time.time() >= entry.expires_at:
+            del self._entries[key]
+            self.stats.expired += 1
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        self.stats.saved_seconds += entry.cost
+        return entry.access_token
+
+    def put(self, token: str, access_token: AccessToken, cost: float = 0.0) -> None:
+        expires_at = time.time() + self.max_ttl
+        if access_token.expires_at is not None:
+            expires_at = min(expires_at, access_token.expires_at)
+        if expires_at <= time.time() or self.max_entries <= 0:
+            return
+        key = self.key_of(token)
+        self._entries[key] = _CachedToken(access_token, expires_at, cost)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "hit_ratio": round(self.stats.hit_ratio, 4),
+            "expired": self.stats.expired,
+            "evictions": self.stats.evictions,
+            "saved_ms": round(self.stats.saved_seconds * 1000, 3),
+        }
+
+
+class RejectedTokenCache:
+    """無効と判定されたトークンのハッシュを ttl 秒だけ覚えておく（同じ無効トークンで何度も問い合わせないため）。"""
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 5.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self._entries: OrderedDict[bytes, float] = OrderedDict()
+
+    def __contains__(self, token: str) -> bool:
+        key = VerifiedTokenCache.key_of(token)
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            return False
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return False
+        self.hits += 1
+        return True
+
+    def add(self, token: str) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        key = VerifiedTokenCache.key_of(token)
+        self._entries[key] = time.time() + self.ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits}
@@ -0,0 +1,220 @@
+# MCPクライアント用のアクセストークン管理（OAuth 2.0 client_credentials）
+# - OIDCディスカバリーの結果（token_endpoint）をキャッシュする
+# - アクセストークンを expires_in の少し前までキャッシュし、必要ならファイルに保存して次回の起動でも使う
+# - 期限が近づいたらバックグラウンドで取り直す
+# - 同時に取り直しが必要になっても、トークンエンドポイントへの問い合わせは1回にまとめる
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# docker-compose で起動するローカルのKeycloak（master レルム）
+DEFAULT_WELL_KNOWN_ENDPOINT = "http://localhost:8080/realms/master/.well-known/openid-configuration"
+
+
+class TokenManager:
+    """well_known_endpoint から token_endpoint を調べ、client_credentials でトークンを取得する。
+
+    - refresh_margin: 有効期限のこの秒数前になったら取り直す（有効期間が短いトークンではその半分まで縮める）
+    - cache_file: トークンとディスカバリーの結果を保存するファイル（None なら保存しない）
+    - discovery_ttl: ディスカバリーの結果を使い回す秒数
+    """
+
+    def __init__(
+        self,
+        well_known_endpoint: str,
+        client_id: str | None,
+        client_secret: str | None,
+        scope: str = "mcp:tools",
+        refresh_margin: float = 30.0,
+        cache_file: str | Path | None = None,
+        discovery_ttl: float = 3600.0,
+        timeout: float = 10.0,
+    ) -> None:
+        self.well_known_endpoint = well_known_endpoint
+        self.client_id = client_id or ""
+        self.client_secret = client_secret or ""
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.discovery_ttl = discovery_ttl
+        self.timeout = timeout
+        self.token_endpoint: str | None = None
+        self.discovered_at = 0.0
+        self.access_token: str | None = None
+        self.expires_at = 0.0
+        self.lifetime = 0.0
+        self.fetches = 0
+        self._refresh: SingleFlight[str] = SingleFlight()
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._load()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    @property
+    def cache_key(self) -> str:
+        # 別のKeycloakやクライアントで保存したトークンを使わないためのキー
+        return f"{self.well_known_endpoint} {self.client_id} {self.scope}"
+
+    @property
+    def margin(self) -> float:
+        return min(self.refresh_margin, self.lifetime / 2)
+
+    def is_valid(self) -> bool:
+        """キャッシュしたトークンが、有効期限まで margin 秒以上残っているか。"""
+        return self.access_token is not None and time.time() < self.expires_at - self.margin
+
+    async def get_token(self) -> str:
+        if self.is_valid():
+            assert self.access_token is not None
+            return self.access_token
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        """トークンを取り直す。同時に呼ばれてもトークンエンドポイントへの問い合わせは1回にまとめる。"""
+        return await self._refresh.do(self.cache_key, self._fetch_token)
+
+    def invalidate(self, token: str | None = None) -> None:
+        """サーバーに拒否されたトークンを捨てる。token を指定したときはそれが現在のトークンの場合だけ捨てる。"""
+        if token is None or token == self.access_token:
+            self.access_token = None
+            self.expires_at = 0.0
+
+    async def _discover(self) -> str:
+        if self.token_endpoint is not None and time.time() - self.discovered_at < self.discovery_ttl:
+            return self.token_endpoint
+        r = await self.client.get(self.well_known_endpoint)
+        r.raise_for_status()
+        self.token_endpoint = r.json()["token_endpoint"]
+        self.discovered_at = time.time()
+        return self.token_endpoint
+
+    async def _fetch_token(self) -> str:
+        token_url = await self._discover()
+        self.fetches += 1
+        r = await self.client.post(
+            token_url,
+            data={
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "scope": self.scope,
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        logger.info("get_access_token %s %s", token_url, r.status_code)
+        r.raise_for_status()
+        data = r.json()
+        self.access_token = data["access_token"]
+        self.lifetime = float(data.get("expires_in", 60))
+        self.expires_at = time.time() + self.lifetime
+        await asyncio.to_thread(self._save)
+        return self.access_token
+
+    def _load(self) -> None:
+        if self.cache_file is None:
+            return
+        try:
+            data: dict[str, Any] = json.loads(self.cache_file.read_text())
+        except (OSError, ValueError):
+            return
+        if data.get("key") != self.cache_key:
+            return
+        self.token_endpoint = data.get("token_endpoint")
+        self.discovered_at = float(data.get("discovered_at", 0))
+        self.access_token = data.get("access_token")
+        self.expires_at = float(data.get("expires_at", 0))
+        self.lifetime = float(data.get("lifetime", 0))
+
+    def _save(self) -> None:
+        if self.cache_file is None:
+            return
+        data = {
+            "key": self.cache_key,
+            "token_endpoint": self.token_endpoint,
+            "discovered_at": self.discovered_at,
+            "access_token": self.access_token,
+            "expires_at": self.expires_at,
+            "lifetime": self.lifetime,
+        }
+        # トークンを含むので所有者だけが読めるようにし、一時ファイルから置き換える
+        tmp = self.cache_file.with_name(f"{self.cache_file.name}.tmp")
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            logger.warning("failed to save token cache %s: %s", self.cache_file, e)
+
+    def start(self) -> None:
+        """期限が近づいたトークンをバックグラウンドで取り直す。"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            # get_token() が取り直しを始めるより少し前に取り直し、リクエストを待たせない
+            await asyncio.sleep(max(1.0, self.expires_at - self.margin * 1.5 - time.time()))
+            try:
+                await self.refresh()
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                logger.warning("token refresh failed: %s", e)
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "TokenManager":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+
+def create_token_manager(scope: str = "mcp:tools") -> TokenManager:
+    """環境変数の設定で TokenManager を作る。
+
+    - OAUTH_WELL_KNOWN_ENDPOINT: OIDCディスカバリーのURL（省略時はローカルのKeycloak）
+    - OAUTH_CLIENT_ID / OAUTH_CLIENT_SECRET: client_credentials で使うクライアント
+    - OAUTH_TOKEN_CACHE: 指定するとトークンをこのファイルに保存し、次回の起動でも使う（省略時は保存しない）
+    """
+    return TokenManager(
+        os.getenv("OAUTH_WELL_KNOWN_ENDPOINT", DEFAULT_WELL_KNOWN_ENDPOINT),
+        os.getenv("OAUTH_CLIENT_ID"),
+        os.getenv("OAUTH_CLIENT_SECRET"),
+        scope=scope,
+        cache_file=os.getenv("OAUTH_TOKEN_CACHE") or None,
+    )
+
+
+async def get_access_token(scope: str = "mcp:tools") -> str:
+    """トークンを1回だけ取得するクライアント向け。保存済みのトークンが有効ならそれを返す。"""
+    # 取り直しのバックグラウンドタスクはいらないので start() はせず、取得後にクライアントを閉じる
+    manager = create_token_manager(scope)
+    try:
+        return await manager.get_token()
+    finally:
+        await manager.aclose()
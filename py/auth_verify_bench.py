@@ -0,0 +1,100 @@
+# JWTの署名検証のスループットを実行モード・ワーカー数ごとに計測する
+# 検証中のイベントループの遅れ（他のリクエストのI/Oがどれだけ待たされるか）も表示する
+#   uv run python auth_verify_bench.py --tokens 2000 --concurrency 64
+#   uv run python auth_verify_bench.py --modes process --workers 1,2,4,8 --alg ES256
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import cast
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from auth_signature_pool import DecodeJob, ExecutorMode, SignatureVerifierPool
+
+ISSUER = "http://localhost:8080/realms/master"
+
+
+def make_jobs(count: int, alg: str) -> list[DecodeJob]:
+    """同じ鍵で署名した、それぞれ異なるトークンを作る（検証キャッシュが効かないように）。"""
+    if alg == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid="bench", use="sig", alg=alg)
+    exp = int(time.time()) + 3600
+    return [
+        DecodeJob(
+            jwt.encode({"iss": ISSUER, "aud": "account", "exp": exp, "jti": str(i)}, private_key, algorithm=alg, headers={"kid": "bench"}),
+            jwk,
+            issuer=ISSUER,
+            audience="account",
+            algorithms=(alg,),
+        )
+        for i in range(count)
+    ]
+
+
+async def measure_lag(stop: asyncio.Event, interval: float = 0.001) -> float:
+    """interval 秒ごとに起きるタスクが、予定よりどれだけ遅れたかの最大値を返す。"""
+    worst = 0.0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - t0 - interval)
+    return worst
+
+
+async def run(pool: SignatureVerifierPool, jobs: list[DecodeJob], concurrency: int) -> tuple[float, float]:
+    # プールの起動（プロセスの生成）は計測に含めない
+    await pool.decode(jobs[0])
+    queue = list(jobs)
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+
+    async def worker() -> None:
+        while queue:
+            await pool.decode(queue.pop())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await lag_task
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="JWT signature verification benchmark")
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--alg", choices=["RS256", "ES256"], default="RS256")
+    parser.add_argument("--modes", default="inline,thread,process")
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, 4, os.cpu_count() or 1})))
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--batch-window", type=float, default=0.0)
+    args = parser.parse_args()
+
+    jobs = make_jobs(args.tokens, args.alg)
+    print(f"cpus={os.cpu_count()} tokens={args.tokens} concurrency={args.concurrency} alg={args.alg}")
+    for mode in args.modes.split(","):
+        for workers in [1] if mode == "inline" else [int(n) for n in args.workers.split(",")]:
+            pool = SignatureVerifierPool(
+                cast(ExecutorMode, mode), workers=workers, max_batch=args.max_batch, batch_window=args.batch_window
+            )
+            try:
+                elapsed, lag = await run(pool, jobs, args.concurrency)
+            finally:
+                pool.shutdown()
+            stats = pool.snapshot()
+            print(
+                f"{mode:>8} workers={workers:<3} rps={len(jobs) / elapsed:9.1f} "
+                f"max_loop_lag={lag * 1000:7.2f}ms avg_batch={stats['avg_batch']}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
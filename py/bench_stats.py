@@ -0,0 +1,17 @@
+# ベンチマークスクリプト共通のレイテンシ集計
+import statistics
+
+
+def percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label: str, samples: list[float], elapsed: float) -> None:
+    ms = [s * 1000 for s in samples]
+    print(
+        f"{label:>12}: n={len(ms)} rps={len(ms) / elapsed:.1f} "
+        f"mean={statistics.mean(ms):.2f}ms p50={percentile(ms, 50):.2f}ms "
+        f"p95={percentile(ms, 95):.2f}ms p99={percentile(ms, 99):.2f}ms"
+    )
@@ -0,0 +1,350 @@
+# resource_server.py の計算履歴ストア
+# 入力は array('d') に詰めた小さなレコードとして保存し、
+# "[1.0, 2.0, 3.0] is 6.0" という文字列は読み出すときに作る
+# - MemoryHistory: 容量固定のリングバッファ（プロセス内だけ、デフォルト）
+# - SQLiteHistory: WALモードのSQLite。再起動後も残り、複数のワーカープロセスで共有できる
+import asyncio
+import contextlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class HistoryRecord:
+    # 追加した順の通し番号（古いレコードが押し出されても変わらない）
+    index: int
+    inputs: array
+    total: float
+    timestamp: float
+
+    @property
+    def nbytes(self) -> int:
+        return self.inputs.itemsize * len(self.inputs)
+
+    def render(self) -> str:
+        return f"{self.inputs.tolist()} is {self.total}"
+
+
+class HistoryStore(Protocol):
+    """resource_server.py が使う計算履歴ストアのインターフェース。
+
+    読み出しはイベントループを止めないように async で行う。
+    first_index / next_index はストアが追加・書き込みのたびに更新する番号で、読んでも問い合わせはしない。
+    """
+
+    @property
+    def first_index(self) -> int: ...
+
+    @property
+    def next_index(self) -> int: ...
+
+    def append(self, inputs: Iterable[float], total: float) -> HistoryRecord | None: ...
+
+    async def bounds(self) -> tuple[int, int]: ...
+
+    async def get(self, index: int) -> HistoryRecord | None: ...
+
+    async def records(self, start: int | None = None, end: int | None = None) -> list[HistoryRecord]: ...
+
+    def snapshot(self) -> dict[str, Any]: ...
+
+
+class MemoryHistory:
+    """容量を固定したリングバッファの計算履歴。
+
+    - capacity: 保持するレコード数の上限。超えたら古いものから押し出す
+    - max_bytes: 保持する入力の合計バイト数の上限。超えたら古いものから押し出す
+    """
+
+    def __init__(self, capacity: int = 10000, max_bytes: int = 8 * 1024 * 1024) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.evicted = 0
+        self._slots: list[HistoryRecord | None] = [None] * capacity
+        # 保持しているのは通し番号 _first 以上 _next 未満のレコード
+        self._first = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._next - self._first
+
+    @property
+    def first_index(self) -> int:
+        return self._first
+
+    @property
+    def next_index(self) -> int:
+        return self._next
+
+    def append(self, inputs: Iterable[float], total: float) -> HistoryRecord:
+        record = HistoryRecord(self._next, array("d", inputs), total, time.time())
+        if record.nbytes > self.max_bytes:
+            raise ValueError(f"record of {record.nbytes} bytes exceeds max_bytes={self.max_bytes}")
+        while len(self) >= self.capacity or self.nbytes + record.nbytes > self.max_bytes:
+            self._evict()
+        self._slots[record.index % self.capacity] = record
+        self.nbytes += record.nbytes
+        self._next += 1
+        return record
+
+    def _evict(self) -> None:
+        slot = self._first % self.capacity
+        record = self._slots[slot]
+        assert record is not None
+        self._slots[slot] = None
+        self.nbytes -= record.nbytes
+        self._first += 1
+        self.evicted += 1
+
+    async def bounds(self) -> tuple[int, int]:
+        """保持している通し番号の範囲 (first_index, next_index) を返す。"""
+        return self._first, self._next
+
+    async def get(self, index: int) -> HistoryRecord | None:
+        """通し番号 index のレコードを返す。押し出された・まだない番号なら None。"""
+        if not self._first <= index < self._next:
+            return None
+        return self._slots[index % self.capacity]
+
+    async def records(self, start: int | None = None, end: int | None = None) -> list[HistoryRecord]:
+        """通し番号 start 以上 end 未満のうち、保持しているレコードを古い順に返す。"""
+        start = self._first if start is None else max(start, self._first)
+        end = self._next if end is None else min(end, self._next)
+        records = []
+        for index in range(start, end):
+            record = self._slots[index % self.capacity]
+            assert record is not None
+            records.append(record)
+        return records
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "max_bytes": self.max_bytes,
+            "size": len(self),
+            "nbytes": self.nbytes,
+            "first_index": self._first,
+            "next_index": self._next,
+            "evicted": self.evicted,
+        }
+
+
+class SQLiteHistory:
+    """計算履歴をSQLite（WALモード）に保存するストア。
+
+    index は行の id - 1 で、複数プロセスから追加しても重複しない。
+    append() はメモリにためるだけで、バックグラウンドのタスクが
+    flush_interval 秒ごと（または batch_size 件たまったとき）に別スレッドでまとめて書き込む。
+    読み出しも別スレッドで行い、その前にこのプロセスでまだ書き込んでいない分を書き込む。
+
+    - capacity: 保持する行数の上限。書き込みのたびに古い行を消す
+    - batch_size: 1回のトランザクションで書き込む件数の目安
+    - flush_interval: 書き込みを待つ最大の秒数
+
+    first_index / next_index はこのプロセスから見た番号で、書き込み・読み出しのたびに更新する
+    （まだ書き込んでいない追加分も数える。他のプロセスの追加は次の書き込み・読み出しで反映される）。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int = 1_000_000,
+        batch_size: int = 256,
+        flush_interval: float = 0.05,
+    ) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flushed = 0
+        self.batches = 0
+        self._pending: list[tuple[bytes, float, float]] = []
+        # 書き込み中（トランザクションの途中）の件数
+        self._writing = 0
+        # 接続はイベントループのスレッドと書き込み用のスレッドで共有するのでロックで守る
+        self._lock = threading.Lock()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                inputs BLOB NOT NULL,
+                total REAL NOT NULL,
+                timestamp REAL NOT NULL
+            )
+            """
+        )
+        self._first, self._next = _bounds(self._conn.execute(_BOUNDS_SQL).fetchone())
+
+    @property
+    def first_index(self) -> int:
+        return max(self._first, self.next_index - self.capacity)
+
+    @property
+    def next_index(self) -> int:
+        return self._next + self._writing + len(self._pending)
+
+    def _read(self, sql: str, params: tuple[Any, ...]) -> list[tuple[Any, ...]]:
+        if self._pending:
+            self.flush()
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def _query(self, sql: str, params: tuple[Any, ...] = ()) -> list[tuple[Any, ...]]:
+        return await asyncio.to_thread(self._read, sql, params)
+
+    async def bounds(self) -> tuple[int, int]:
+        """保持している通し番号の範囲 (first_index, next_index) を1回の問い合わせで返す。"""
+        (row,) = await self._query(_BOUNDS_SQL)
+        self._first, self._next = _bounds(row)
+        return self._first, self._next
+
+    def append(self, inputs: Iterable[float], total: float) -> None:
+        self._pending.append((array("d", inputs).tobytes(), total, time.time()))
+        if self._task is None:
+            self.start()
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    async def get(self, index: int) -> HistoryRecord | None:
+        rows = await self._query("SELECT id, inputs, total, timestamp FROM history WHERE id = ?", (index + 1,))
+        return _record(rows[0]) if rows else None
+
+    async def records(self, start: int | None = None, end: int | None = None) -> list[HistoryRecord]:
+        rows = await self._query(
+            "SELECT id, inputs, total, timestamp FROM history WHERE id > ? AND id <= ? ORDER BY id",
+            (start or 0, 2**63 - 1 if end is None else end),
+        )
+        return list(map(_record, rows))
+
+    def flush(self) -> None:
+        """ためている追加分を1つのトランザクションで書き込む。"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            self._writing = len(pending)
+            try:
+                with self._conn:
+                    self._conn.execute("BEGIN IMMEDIATE")
+                    self._conn.executemany("INSERT INTO history (inputs, total, timestamp) VALUES (?, ?, ?)", pending)
+                    self._conn.execute(
+                        "DELETE FROM history WHERE id <= (SELECT seq FROM sqlite_sequence WHERE name = 'history') - ?",
+                        (self.capacity,),
+                    )
+                    bounds = _bounds(self._conn.execute(_BOUNDS_SQL).fetchone())
+            except sqlite3.Error:
+                # 書き込めなかった分は次の書き込みで再試行する
+                self._writing = 0
+                self._pending[:0] = pending
+                raise
+            self._writing = 0
+            self._first, self._next = bounds
+            self.flushed += len(pending)
+            self.batches += 1
+
+    def start(self) -> None:
+        """バックグラウンドの書き込みタスクを起動する。イベントループの外では append() のたびに書き込む。"""
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        except RuntimeError:
+            self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            self._full.clear()
+            if not self._pending:
+                continue
+            try:
+                await asyncio.to_thread(self.flush)
+            except sqlite3.Error as e:
+                logger.warning("failed to write calculation history: %s", e)
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.flush()
+        self._conn.close()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "path": self.path,
+            "capacity": self.capacity,
+            "first_index": self.first_index,
+            "next_index": self.next_index,
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "batches": self.batches,
+        }
+
+
+# 古い行を消しても AUTOINCREMENT の番号は戻らないので、next_index は sqlite_sequence から読む
+_BOUNDS_SQL = "SELECT (SELECT MIN(id) FROM history), (SELECT seq FROM sqlite_sequence WHERE name = 'history')"
+
+
+def _bounds(row: tuple[Any, ...]) -> tuple[int, int]:
+    first, seq = row
+    next_index = seq or 0
+    return (next_index if first is None else first - 1), next_index
+
+
+def _record(row: tuple[Any, ...]) -> HistoryRecord:
+    inputs = array("d")
+    inputs.frombytes(row[1])
+    return HistoryRecord(row[0] - 1, inputs, row[2], row[3])
+
+
+class HistoryRenderer:
+    """レンダリングした履歴の行を通し番号ごとにキャッシュする。
+
+    レコードは追加後に変わらないので、一度作った行はそのまま使い回せる。
+    読み出しのたびに文字列にするのは、前回から増えた（キャッシュにない）レコードだけになる。
+    - max_entries: キャッシュする行数の上限。超えたら先に作った行から捨てる
+    """
+
+    def __init__(self, store: HistoryStore, max_entries: int = 10000) -> None:
+        self.store = store
+        self.max_entries = max_entries
+        self.rendered = 0
+        self.hits = 0
+        self._lines: dict[int, str] = {}
+
+    async def lines(self, start: int, end: int, bounds: tuple[int, int] | None = None) -> list[tuple[int, str]]:
+        """通し番号 start 以上 end 未満（最大 max_entries 件）のうち、ストアが保持している行を (index, 行) で古い順に返す。
+
+        bounds には呼び出し側が読んだ store.bounds() を渡せる（省略するとここで読む）。
+        """
+        first, next_index = await self.store.bounds() if bounds is None else bounds
+        start = max(start, first)
+        end = max(start, min(end, next_index, start + self.max_entries))
+        missing = [index for index in range(start, end) if index not in self._lines]
+        for record in await self.store.records(missing[0], missing[-1] + 1) if missing else ():
+            if record.index not in self._lines:
+                self._lines[record.index] = record.render()
+                self.rendered += 1
+        self.hits += end - start - len(missing)
+        lines = [(index, self._lines[index]) for index in range(start, end) if index in self._lines]
+        while len(self._lines) > self.max_entries:
+            del self._lines[next(iter(self._lines))]
+        return lines
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"max_entries": self.max_entries, "size": len(self._lines), "rendered": self.rendered, "hits": self.hits}
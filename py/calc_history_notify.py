@@ -0,0 +1,92 @@
+# 計算履歴が増えたとき、購読している calculator://history* のセッションに更新を通知する
+# 短い時間に続けて計算されたときは window 秒の間の変更を1回の通知にまとめる
+import asyncio
+import logging
+from urllib.parse import parse_qs
+
+from calc_history import HistoryStore
+from resource_subscriptions import ResourceSubscriptions
+
+logger = logging.getLogger(__name__)
+
+HISTORY_URI = "calculator://history"
+
+
+def history_uri_affected(uri: str, changed: list[range]) -> bool:
+    """changed の範囲の通し番号が追加・押し出されたとき、uri の内容が変わるか。"""
+    if uri == HISTORY_URI:
+        return True
+    rest = uri.removeprefix(HISTORY_URI)
+    if rest.startswith("?"):
+        # ページには next_index が含まれるので、どのページも変わる
+        return all(value.isdigit() for values in parse_qs(rest[1:]).values() for value in values)
+    parts = rest.removeprefix("/").split("/")
+    if not rest.startswith("/") or not all(part.isdigit() for part in parts) or len(parts) > 2:
+        return False
+    start = int(parts[0])
+    end = int(parts[1]) if len(parts) == 2 else start + 1
+    return any(start < r.stop and r.start < end for r in changed)
+
+
+class HistoryNotifier:
+    """calculator_sum のあとに changed() を呼ぶと、影響のある購読URIに notifications/resources/updated を送る。
+
+    新しい通し番号の履歴が増えたときは notifications/resources/list_changed も送る。
+    - window: 通知をまとめる秒数。0 なら changed() の中ですぐに送る
+    """
+
+    def __init__(self, store: HistoryStore, subscriptions: ResourceSubscriptions, window: float = 0.05) -> None:
+        self.store = store
+        self.subscriptions = subscriptions
+        self.window = window
+        self.notifications = 0
+        self.coalesced = 0
+        # 最後に通知したときの保持範囲（ストアが更新している番号を読むだけで、問い合わせはしない）
+        self._first = store.first_index
+        self._next = store.next_index
+        # 通知をまとめている間（window 秒の待ち）だけ入る
+        self._task: asyncio.Task[None] | None = None
+        # 実行中の通知タスクへの参照（完了したら消す）
+        self._background: set[asyncio.Task[None]] = set()
+
+    async def changed(self) -> None:
+        if not self.subscriptions.uris():
+            return
+        if self.window <= 0:
+            await self.flush()
+        elif self._task is None:
+            self._task = asyncio.create_task(self._flush_later())
+            self._background.add(self._task)
+            self._task.add_done_callback(self._done)
+        else:
+            self.coalesced += 1
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            # 通知を送っている間の変更は次の通知にまとめる
+            self._task = None
+        await self.flush()
+
+    def _done(self, task: asyncio.Task[None]) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and (error := task.exception()) is not None:
+            logger.warning("failed to notify history subscribers: %s", error)
+
+    async def flush(self) -> None:
+        first, next_index = self.store.first_index, self.store.next_index
+        evicted, added = range(self._first, first), range(self._next, next_index)
+        self._first, self._next = first, next_index
+        changed = [r for r in (evicted, added) if r]
+        if not changed:
+            return
+        for uri in self.subscriptions.uris():
+            if history_uri_affected(uri, changed):
+                self.notifications += 1
+                await self.subscriptions.notify_updated(uri)
+        if added:
+            await self.subscriptions.notify_list_changed()
+
+    def snapshot(self) -> dict[str, int | float]:
+        return {"window": self.window, "notifications": self.notifications, "coalesced": self.coalesced}
@@ -0,0 +1,61 @@
+# get_alerts の検索条件をNWS APIのクエリパラメータに変換する
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import urlencode
+
+
+def _normalize(values: list[str] | None, transform: Callable[[str], str] = str.strip) -> tuple[str, ...]:
+    # 順序と大文字小文字をそろえて、同じ条件が同じURL（キャッシュキー）になるようにする
+    return tuple(sorted({transform(v.strip()) for v in values or [] if v.strip()}))
+
+
+@dataclass(frozen=True)
+class AlertQuery:
+    states: tuple[str, ...]
+    severity: tuple[str, ...] = ()
+    event: tuple[str, ...] = ()
+    urgency: tuple[str, ...] = ()
+
+    @classmethod
+    def create(
+        cls,
+        state: str | list[str],
+        severity: list[str] | None = None,
+        event: list[str] | None = None,
+        urgency: list[str] | None = None,
+    ) -> "AlertQuery":
+        states = state.split(",") if isinstance(state, str) else state
+        return cls(
+            states=_normalize(states, str.upper),
+            severity=_normalize(severity, str.capitalize),
+            event=_normalize(event),
+            urgency=_normalize(urgency, str.capitalize),
+        )
+
+    @property
+    def single_state(self) -> str | None:
+        """絞り込みのない1州だけの問い合わせならその州を返す。"""
+        if len(self.states) == 1 and not (self.severity or self.event or self.urgency):
+            return self.states[0]
+        return None
+
+    def url(self, base: str) -> str:
+        if (state := self.single_state) is not None:
+            return f"{base}/alerts/active/area/{state}"
+        params = {
+            "area": self.states,
+            "severity": self.severity,
+            "event": self.event,
+            "urgency": self.urgency,
+        }
+        query = urlencode({key: ",".join(values) for key, values in params.items() if values}, safe=",")
+        return f"{base}/alerts/active?{query}"
+
+    def matches(self, feature: dict[str, Any]) -> bool:
+        """NWS側で絞り込まれなかった場合に備えて、手元でも条件を確認する。"""
+        props = feature["properties"]
+        for key, values in (("severity", self.severity), ("event", self.event), ("urgency", self.urgency)):
+            if values and str(props.get(key, "")).lower() not in {v.lower() for v in values}:
+                return False
+        return True
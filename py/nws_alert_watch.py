@@ -0,0 +1,109 @@
+# 購読されている州のアラートを定期的に確認し、アラートIDの集合が変わったときだけ通知する
+import asyncio
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from resource_subscriptions import ResourceSubscriptions
+
+ALERTS_URI_PREFIX = "weather://alerts/"
+
+AlertFetcher = Callable[[str], Awaitable[dict[str, Any] | None]]
+
+
+def alert_ids(data: dict[str, Any]) -> set[str]:
+    return {feature.get("id") or feature["properties"].get("id") for feature in data.get("features", [])}
+
+
+def alerts_uri(state: str) -> str:
+    return f"{ALERTS_URI_PREFIX}{state}"
+
+
+def alerts_delta_uri(state: str) -> str:
+    return f"{ALERTS_URI_PREFIX}{state}/delta"
+
+
+@dataclass
+class AlertDelta:
+    version: int = 0
+    ids: set[str] = field(default_factory=set)
+    added: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def as_dict(self, state: str) -> dict[str, Any]:
+        return {
+            "state": state,
+            "version": self.version,
+            "added": self.added,
+            "removed": self.removed,
+            "count": len(self.ids),
+        }
+
+
+class AlertWatcher:
+    """購読中の weather://alerts/{state} を interval 秒ごとに確認する。"""
+
+    def __init__(self, fetch: AlertFetcher, subscriptions: ResourceSubscriptions, interval: float = 60.0) -> None:
+        self.fetch = fetch
+        self.subscriptions = subscriptions
+        self.interval = interval
+        self._deltas: dict[str, AlertDelta] = {}
+        self._task: asyncio.Task[None] | None = None
+
+    def subscribed_states(self) -> set[str]:
+        return {
+            uri.removeprefix(ALERTS_URI_PREFIX).split("/")[0]
+            for uri in self.subscriptions.uris()
+            if uri.startswith(ALERTS_URI_PREFIX)
+        }
+
+    def delta(self, state: str) -> AlertDelta:
+        return self._deltas.get(state, AlertDelta())
+
+    def observe(self, state: str, data: dict[str, Any]) -> bool:
+        """取得したアラートを記録し、前回からIDの集合が変わったかを返す。"""
+        ids = alert_ids(data)
+        previous = self._deltas.get(state)
+        if previous is None:
+            self._deltas[state] = AlertDelta(version=1, ids=ids, added=sorted(ids))
+            return False
+        if ids == previous.ids:
+            return False
+        self._deltas[state] = AlertDelta(
+            version=previous.version + 1,
+            ids=ids,
+            added=sorted(ids - previous.ids),
+            removed=sorted(previous.ids - ids),
+        )
+        return True
+
+    async def check(self, state: str) -> None:
+        data = await self.fetch(state)
+        if data is None or not self.observe(state, data):
+            return
+        await self.subscriptions.notify_updated(alerts_uri(state))
+        await self.subscriptions.notify_updated(alerts_delta_uri(state))
+
+    async def check_all(self) -> None:
+        states = self.subscribed_states()
+        # 購読がなくなった州の状態は捨てる
+        for state in list(self._deltas):
+            if state not in states:
+                del self._deltas[state]
+        await asyncio.gather(*(self.check(state) for state in states), return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check_all()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
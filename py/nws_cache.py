@@ -0,0 +1,150 @@
+# NWS APIレスポンスのインプロセスキャッシュ
+# エンドポイントごとのTTL、件数/バイト数によるLRU追い出し、ETag/Last-Modifiedによる再検証を行う
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class CacheEntry:
+    data: dict[str, Any]
+    size: int
+    expires_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+    def validators(self) -> dict[str, str]:
+        """条件付きリクエスト用のヘッダーを返す。"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stale: int = 0
+    revalidated: int = 0
+    evictions: int = 0
+    per_endpoint: dict[str, dict[str, int]] = field(default_factory=dict)
+
+    def record(self, endpoint: str, outcome: str) -> None:
+        counters = self.per_endpoint.setdefault(endpoint, {})
+        counters[outcome] = counters.get(outcome, 0) + 1
+
+
+class ResponseCache:
+    """URLをキーにしたLRUキャッシュ。
+
+    - ttls: URLパスの接頭辞ごとのTTL（秒）。最初に一致したものが使われる
+    - max_entries / max_bytes: どちらかを超えたら古いものから追い出す
+    """
+
+    def __init__(
+        self,
+        ttls: dict[str, float],
+        default_ttl: float = 300.0,
+        max_entries: int = 1024,
+        max_bytes: int = 32 * 1024 * 1024,
+    ) -> None:
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._bytes = 0
+
+    def endpoint_of(self, url: str) -> str:
+        for prefix in self.ttls:
+            if prefix in url:
+                return prefix
+        return "default"
+
+    def ttl_for(self, url: str) -> float:
+        return self.ttls.get(self.endpoint_of(url), self.default_ttl)
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        """エントリを返す。期限切れでも再検証用に返すので is_fresh で判定すること。"""
+        endpoint = self.endpoint_of(url)
+        entry = self._entries.get(url)
+        if entry is None:
+            self.stats.misses += 1
+            self.stats.record(endpoint, "misses")
+            return None
+        self._entries.move_to_end(url)
+        if entry.is_fresh(time.monotonic()):
+            self.stats.hits += 1
+            self.stats.record(endpoint, "hits")
+        else:
+            self.stats.stale += 1
+            self.stats.record(endpoint, "stale")
+        return entry
+
+    def store(
+        self,
+        url: str,
+        data: dict[str, Any],
+        size: int,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        self._remove(url)
+        if size > self.max_bytes:
+            return
+        self._entries[url] = CacheEntry(
+            data=data,
+            size=size,
+            expires_at=time.monotonic() + self.ttl_for(url),
+            etag=etag,
+            last_modified=last_modified,
+        )
+        self._bytes += size
+        self._evict()
+
+    def refresh(self, url: str, entry: CacheEntry) -> None:
+        """304 Not Modified を受けたエントリの有効期限を延長する。"""
+        entry.expires_at = time.monotonic() + self.ttl_for(url)
+        self.stats.revalidated += 1
+        self.stats.record(self.endpoint_of(url), "revalidated")
+
+    def invalidate(self, url: str) -> None:
+        self._remove(url)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, url: str) -> None:
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.stats.evictions += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """チューニング用のカウンタを返す。"""
+        lookups = self.stats.hits + self.stats.misses + self.stats.stale
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "stale": self.stats.stale,
+            "revalidated": self.stats.revalidated,
+            "evictions": self.stats.evictions,
+            "hit_ratio": self.stats.hits / lookups if lookups else 0.0,
+            "per_endpoint": self.stats.per_endpoint,
+        }
@@ -0,0 +1,152 @@
+# 天気ツールの構造化出力（Pydanticモデル）とテキスト表現
+# detail で出力の詳しさを切り替える
+#   compact: 1件1行。LLMのコンテキストを節約したいとき
+#   normal:  従来のテキスト出力と同じ項目
+#   full:    NWSの時刻や確度なども含める
+from typing import Annotated, Any, Literal
+
+from mcp.types import CallToolResult, TextContent
+from pydantic import BaseModel, Field
+
+Detail = Literal["compact", "normal", "full"]
+# 予報のピリオド（半日単位）の数。NWSの予報は7日分（14ピリオド）
+Periods = Annotated[int, Field(ge=1, le=14)]
+
+ALERT_SEPARATOR = "\n---\n"
+FORECAST_SEPARATOR = "\n---\n"
+
+
+class ForecastPeriod(BaseModel):
+    name: str
+    temperature: float
+    temperature_unit: str
+    forecast: str
+    wind: str | None = None
+    start_time: str | None = None
+    end_time: str | None = None
+    precipitation_probability: float | None = None
+
+
+class ForecastResult(BaseModel):
+    latitude: float
+    longitude: float
+    periods: list[ForecastPeriod] = []
+    error: str | None = None
+
+
+class ForecastBatchResult(BaseModel):
+    results: list[ForecastResult]
+
+
+class AlertSummary(BaseModel):
+    event: str
+    severity: str
+    area: str
+    id: str | None = None
+    urgency: str | None = None
+    certainty: str | None = None
+    headline: str | None = None
+    description: str | None = None
+    instruction: str | None = None
+    effective: str | None = None
+    expires: str | None = None
+
+
+class AlertsResult(BaseModel):
+    alerts: list[AlertSummary] = []
+    truncated: bool = False
+    message: str | None = None
+
+
+def tool_result(text: str, model: BaseModel) -> CallToolResult:
+    """テキストと構造化出力の両方を持つツール結果を作る。構造化出力では None の項目を省く。"""
+    return CallToolResult(
+        content=[TextContent(type="text", text=text)],
+        structuredContent=model.model_dump(exclude_none=True),
+    )
+
+
+def summarize_period(period: dict[str, Any], detail: Detail) -> ForecastPeriod:
+    summary = ForecastPeriod(
+        name=period["name"],
+        temperature=period["temperature"],
+        temperature_unit=period["temperatureUnit"],
+        forecast=period.get("shortForecast") or period["detailedForecast"],
+    )
+    if detail == "compact":
+        return summary
+    summary.wind = f"{period['windSpeed']} {period['windDirection']}"
+    summary.forecast = period["detailedForecast"]
+    if detail == "full":
+        summary.start_time = period.get("startTime")
+        summary.end_time = period.get("endTime")
+        summary.precipitation_probability = (period.get("probabilityOfPrecipitation") or {}).get("value")
+    return summary
+
+
+def format_period(period: ForecastPeriod, detail: Detail) -> str:
+    """予報のピリオドを読みやすい文字列にフォーマットする。"""
+    temperature = f"{period.temperature:g}°{period.temperature_unit}"
+    if detail == "compact":
+        return f"{period.name}: {temperature}, {period.forecast}"
+    text = f"""
+{period.name}:
+Temperature: {temperature}
+Wind: {period.wind}
+Forecast: {period.forecast}
+"""
+    if detail == "full":
+        text += f"""Time: {period.start_time} - {period.end_time}
+Precipitation: {period.precipitation_probability if period.precipitation_probability is not None else "Unknown"}%
+"""
+    return text
+
+
+def format_periods(periods: list[ForecastPeriod], detail: Detail) -> str:
+    separator = "\n" if detail == "compact" else FORECAST_SEPARATOR
+    return separator.join(format_period(period, detail) for period in periods)
+
+
+def summarize_alert(feature: dict[str, Any], detail: Detail) -> AlertSummary:
+    props = feature["properties"]
+    summary = AlertSummary(
+        event=props.get("event", "Unknown"),
+        severity=props.get("severity", "Unknown"),
+        area=props.get("areaDesc", "Unknown"),
+        id=feature.get("id") or props.get("id"),
+    )
+    if detail == "compact":
+        return summary
+    summary.description = props.get("description") or "No description available"
+    summary.instruction = props.get("instruction") or "No specific instructions provided"
+    if detail == "full":
+        summary.urgency = props.get("urgency")
+        summary.certainty = props.get("certainty")
+        summary.headline = props.get("headline")
+        summary.effective = props.get("effective")
+        summary.expires = props.get("expires")
+    return summary
+
+
+def format_alert(alert: AlertSummary, detail: Detail) -> str:
+    """アラートを読みやすい文字列にフォーマットする。"""
+    if detail == "compact":
+        return f"{alert.event} ({alert.severity}): {alert.area}"
+    text = f"""
+Event: {alert.event}
+Area: {alert.area}
+Severity: {alert.severity}
+Description: {alert.description}
+Instructions: {alert.instruction}
+"""
+    if detail == "full":
+        text += f"""Urgency: {alert.urgency or "Unknown"}
+Certainty: {alert.certainty or "Unknown"}
+Effective: {alert.effective or "Unknown"}
+Expires: {alert.expires or "Unknown"}
+"""
+    return text
+
+
+def alert_separator(detail: Detail) -> str:
+    return "\n" if detail == "compact" else ALERT_SEPARATOR
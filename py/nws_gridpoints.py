@@ -0,0 +1,96 @@
+# 緯度経度 → NWS予報URL の永続キャッシュ
+# /points/{lat},{lon} の結果をSQLiteに保存し、再起動後や複数ワーカー間で共有する
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Gridpoint:
+    forecast: str
+    forecast_hourly: str | None
+    # 永続キャッシュから読み出したものかどうか
+    cached: bool = False
+
+
+class GridpointStore:
+    """量子化した座標をキーに予報URLを保存するSQLiteストア。
+
+    WALモードで開くため、同じファイルを複数プロセスから読み書きできる。
+    他のプロセスが書き込み中で待たされてもイベントループを止めないよう、読み書きは別スレッドで行う。
+    キャッシュなので、ロックが取れないなどで読み書きに失敗したときは「ない」として扱い、書き込みは諦める。
+
+    - busy_timeout: 他のプロセスのロックを待つ最大の秒数（ツールの応答が待たされる時間の上限）
+    """
+
+    def __init__(
+        self,
+        path: str,
+        precision: int = 4,
+        max_age: float = 30 * 24 * 3600,
+        busy_timeout: float = 1.0,
+    ) -> None:
+        self.path = path
+        self.precision = precision
+        self.max_age = max_age
+        # 接続は複数のスレッドから使うのでロックで守る
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS gridpoints (
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                forecast TEXT NOT NULL,
+                forecast_hourly TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (lat, lon)
+            )
+            """
+        )
+
+    def quantize(self, latitude: float, longitude: float) -> tuple[float, float]:
+        # NWS API も座標を小数点以下4桁に丸めて扱う
+        return round(latitude, self.precision), round(longitude, self.precision)
+
+    def _get(self, latitude: float, longitude: float) -> Gridpoint | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT forecast, forecast_hourly FROM gridpoints WHERE lat = ? AND lon = ? AND updated_at >= ?",
+                (*self.quantize(latitude, longitude), time.time() - self.max_age),
+            ).fetchone()
+        if row is None:
+            return None
+        return Gridpoint(forecast=row[0], forecast_hourly=row[1], cached=True)
+
+    def _put(self, latitude: float, longitude: float, gridpoint: Gridpoint) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO gridpoints (lat, lon, forecast, forecast_hourly, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (*self.quantize(latitude, longitude), gridpoint.forecast, gridpoint.forecast_hourly, time.time()),
+            )
+
+    async def get(self, latitude: float, longitude: float) -> Gridpoint | None:
+        try:
+            return await asyncio.to_thread(self._get, latitude, longitude)
+        except sqlite3.Error as e:
+            logger.warning("failed to read gridpoint cache: %s", e)
+            return None
+
+    async def put(self, latitude: float, longitude: float, gridpoint: Gridpoint) -> None:
+        try:
+            await asyncio.to_thread(self._put, latitude, longitude, gridpoint)
+        except sqlite3.Error as e:
+            logger.warning("failed to write gridpoint cache: %s", e)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,115 @@
+# よく問い合わせられる州のアラートをバックグラウンドで先読みしておく
+# ツール呼び出しにはメモリ上の値を返し（stale-while-revalidate）、更新は裏で行う
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+AlertFetcher = Callable[[str], Awaitable[dict[str, Any] | None]]
+
+
+@dataclass
+class AlertSnapshot:
+    data: dict[str, Any]
+    fetched_at: float
+
+
+class HotAlertRefresher:
+    """州ごとの問い合わせ回数を数え、上位 hot_size 件のアラートを interval 秒ごとに更新する。
+
+    - 更新から interval 秒を過ぎた値も max_stale 秒までは返し、裏で再取得する
+    - 問い合わせ回数は更新のたびに半減させ、最近の傾向に追従させる
+    """
+
+    def __init__(
+        self,
+        fetch: AlertFetcher,
+        hot_size: int = 10,
+        interval: float = 60.0,
+        max_stale: float = 300.0,
+    ) -> None:
+        self.fetch = fetch
+        self.hot_size = hot_size
+        self.interval = interval
+        self.max_stale = max_stale
+        self._counts: dict[str, float] = {}
+        self._payloads: dict[str, AlertSnapshot] = {}
+        self._refreshing: set[str] = set()
+        self._background: set[asyncio.Task[None]] = set()
+        self._task: asyncio.Task[None] | None = None
+        self.served_from_memory = 0
+
+    def hot_states(self) -> list[str]:
+        ranked = sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+        return [state for state, _ in ranked[: self.hot_size]]
+
+    def lookup(self, state: str) -> dict[str, Any] | None:
+        """問い合わせを数え、メモリ上の値があれば返す（古ければ裏で再取得する）。"""
+        self._counts[state] = self._counts.get(state, 0.0) + 1.0
+        snapshot = self._payloads.get(state)
+        if snapshot is None:
+            return None
+        age = time.monotonic() - snapshot.fetched_at
+        if age >= self.max_stale:
+            return None
+        if age >= self.interval:
+            self._spawn_refresh(state)
+        self.served_from_memory += 1
+        return snapshot.data
+
+    def remember(self, state: str, data: dict[str, Any]) -> None:
+        """取得した値をホットな州であればメモリに保持する。"""
+        if state in self.hot_states():
+            self._payloads[state] = AlertSnapshot(data, time.monotonic())
+
+    async def refresh(self, state: str) -> None:
+        if state in self._refreshing:
+            return
+        self._refreshing.add(state)
+        try:
+            data = await self.fetch(state)
+            if data is not None:
+                self._payloads[state] = AlertSnapshot(data, time.monotonic())
+        finally:
+            self._refreshing.discard(state)
+
+    def _spawn_refresh(self, state: str) -> None:
+        if state in self._refreshing:
+            return
+        task = asyncio.create_task(self.refresh(state))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def refresh_hot(self) -> None:
+        hot = self.hot_states()
+        # ホットでなくなった州の値は捨てる
+        for state in list(self._payloads):
+            if state not in hot:
+                del self._payloads[state]
+        await asyncio.gather(*(self.refresh(state) for state in hot), return_exceptions=True)
+        self._counts = {state: count / 2 for state, count in self._counts.items() if count / 2 >= 0.5}
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh_hot()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [*self._background, *([self._task] if self._task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def snapshot(self) -> dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "hot_states": self.hot_states(),
+            "served_from_memory": self.served_from_memory,
+            "ages": {state: round(now - snap.fetched_at, 3) for state, snap in self._payloads.items()},
+        }
@@ -0,0 +1,243 @@
+# NWS APIへのリクエストを遅延と障害に強くする
+# - 直近のレイテンシのp99から決める適応的タイムアウト
+# - 一定の待ち時間を超えたら同じリクエストをもう1本送るヘッジ
+# - 冪等なGETの一時的な失敗だけをジッター付きでリトライ
+# - 失敗が続いたら一定時間すぐに失敗させるサーキットブレーカー
+import asyncio
+import contextlib
+import random
+import time
+from collections import deque
+from collections.abc import Iterator
+from typing import Any
+
+import httpx
+
+# リトライしてよいステータスコード（一時的な障害）
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているためリクエストを送らなかった。"""
+
+
+class CircuitBreaker:
+    """連続 failure_threshold 回失敗したら reset_timeout 秒間リクエストを止める。
+
+    reset_timeout 経過後は1本だけ試し（half-open）、成功すれば元に戻す。
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.rejected = 0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    @contextlib.contextmanager
+    def guard(self, url: str) -> Iterator[bool]:
+        """allow() で許可されたときだけ中の処理を実行する。許可されなければ CircuitOpenError を送出する。
+
+        half-open の試行のときは True を返す。
+
+        half-open の試行が record_* されないまま終わった（キャンセルや想定外の例外）ときは失敗として扱い、
+        試行中のまま残ってブレーカーが閉じなくなるのを防ぐ。
+        """
+        if not self.allow():
+            raise CircuitOpenError(url)
+        probe = self._probing
+        try:
+            yield probe
+        finally:
+            if probe and self._probing:
+                self.record_failure()
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_status(self, status_code: int) -> None:
+        """レスポンスのステータスコードから成功/失敗を記録する。"""
+        if status_code in RETRYABLE_STATUS or status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class LatencyTracker:
+    """直近 window 件のレイテンシ（秒）を保持し、パーセンタイルを返す。
+
+    タイムアウトした試行もタイムアウトの値で記録する（遅くなったときにタイムアウトが伸びるように）。
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class ResilientFetcher:
+    """タイムアウト・ヘッジ・リトライ・サーキットブレーカーをまとめたGET。
+
+    - deadline: リトライを含めた全体の時間の上限（秒）。各試行のタイムアウトも残り時間までに縮める
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        tracker: LatencyTracker,
+        max_timeout: float = 30.0,
+        min_timeout: float = 1.0,
+        timeout_multiplier: float = 3.0,
+        hedge_percentile: float | None = None,
+        retries: int = 2,
+        backoff: float = 0.2,
+        deadline: float = 10.0,
+    ) -> None:
+        self.breaker = breaker
+        self.tracker = tracker
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.hedge_percentile = hedge_percentile
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.hedges = 0
+        self.retried = 0
+
+    def timeout(self) -> float:
+        """p99 × timeout_multiplier を [min_timeout, max_timeout] に収めたタイムアウト（deadline は超えない）。"""
+        max_timeout = min(self.max_timeout, self.deadline)
+        p99 = self.tracker.percentile(99)
+        if p99 is None:
+            return max_timeout
+        return min(max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    async def get(self, client: httpx.AsyncClient, url: str, headers: dict[str, str]) -> httpx.Response:
+        with self.breaker.guard(url) as probe:
+            return await self._get_with_retries(client, url, headers, probe)
+
+    async def _get_with_retries(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: dict[str, str],
+        probe: bool = False,
+    ) -> httpx.Response:
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                # full jitter: 0〜backoff×2^attempt 秒待つ（締め切りは超えない）
+                self.retried += 1
+                await asyncio.sleep(min(random.uniform(0, self.backoff * 2**attempt), deadline - time.monotonic()))
+            remaining = deadline - time.monotonic()
+            last = attempt == self.retries or remaining <= self.min_timeout
+            try:
+                if remaining <= 0:
+                    raise TimeoutError(f"deadline exceeded: {url}")
+                # half-open の試行は学習したタイムアウトではなく max_timeout まで待つ
+                timeout = self.max_timeout if probe else self.timeout()
+                response = await self._hedged_get(client, url, headers, min(timeout, remaining))
+            except (httpx.TransportError, TimeoutError):
+                if last:
+                    self.breaker.record_failure()
+                    raise
+                continue
+            if response.status_code not in RETRYABLE_STATUS or last:
+                self.breaker.record_status(response.status_code)
+                return response
+        raise AssertionError("unreachable")
+
+    async def _timed_get(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: dict[str, str],
+        timeout: float,
+    ) -> httpx.Response:
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(client.get(url, headers=headers, timeout=timeout), timeout)
+        except (httpx.TimeoutException, TimeoutError):
+            self.tracker.record(max(timeout, time.monotonic() - start))
+            raise
+        self.tracker.record(time.monotonic() - start)
+        return response
+
+    async def _hedged_get(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: dict[str, str],
+        timeout: float,
+    ) -> httpx.Response:
+        hedge_delay = self.tracker.percentile(self.hedge_percentile) if self.hedge_percentile else None
+        primary = asyncio.create_task(self._timed_get(client, url, headers, timeout))
+        if hedge_delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        # 応答が遅いので同じリクエストをもう1本送り、先に返ってきた方を使う
+        self.hedges += 1
+        tasks = {primary, asyncio.create_task(self._timed_get(client, url, headers, timeout - hedge_delay))}
+        try:
+            error: BaseException | None = None
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except (httpx.TransportError, TimeoutError) as e:
+                    error = e
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "rejected": self.breaker.rejected,
+            "timeout": round(self.timeout(), 3),
+            "p50": self.tracker.percentile(50),
+            "p99": self.tracker.percentile(99),
+            "hedges": self.hedges,
+            "retries": self.retried,
+        }
@@ -0,0 +1,95 @@
+# GeoJSON FeatureCollection をチャンク単位で読み、features 配列の要素を1件ずつ取り出す
+# レスポンス全体を response.json() で読み込まずに済むため、巨大なアラートでもメモリが増えない
+import codecs
+import json
+from typing import Any
+
+_WHITESPACE = " \t\r\n"
+
+
+class FeatureStreamParser:
+    """feed() にバイト列を渡すたびに、読み終わった feature を返す。"""
+
+    def __init__(self) -> None:
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._found = False
+        self._done = False
+        # features キーを探す間の字句解析の状態
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = ""
+        self.bytes_read = 0
+
+    def feed(self, chunk: bytes) -> list[dict[str, Any]]:
+        self.bytes_read += len(chunk)
+        self._buffer += self._decoder.decode(chunk)
+        if not self._found:
+            self._seek_features()
+        if not self._found or self._done:
+            return []
+        return self._read_items()
+
+    def close(self) -> None:
+        """ストリームの終端で呼ぶ。features 配列が閉じていなければ例外を送出する。"""
+        if not self._done:
+            raise ValueError("incomplete FeatureCollection: features array not closed")
+
+    def _seek_features(self) -> None:
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            c = buffer[i]
+            if self._in_string:
+                self._scan_string(c, i)
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == "[" and self._depth == 1 and self._last_key == "features":
+                self._found = True
+                self._buffer = buffer[i + 1 :]
+                self._pos = 0
+                return
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+            i += 1
+        self._pos = i
+
+    def _scan_string(self, c: str, i: int) -> None:
+        if self._escape:
+            self._escape = False
+        elif c == "\\":
+            self._escape = True
+        elif c == '"':
+            self._in_string = False
+            if self._depth == 1:
+                self._last_key = self._buffer[self._string_start + 1 : i]
+
+    def _read_items(self) -> list[dict[str, Any]]:
+        items = []
+        buffer = self._buffer
+        pos = 0
+        while True:
+            while pos < len(buffer) and (buffer[pos] in _WHITESPACE or buffer[pos] == ","):
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                self._done = True
+                pos += 1
+                break
+            try:
+                item, end = self._json.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # 要素の途中でチャンクが切れているので続きを待つ
+                break
+            items.append(item)
+            pos = end
+        self._buffer = buffer[pos:]
+        return items
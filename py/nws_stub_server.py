@@ -0,0 +1,254 @@
+# ベンチマーク用のNWS API（api.weather.gov）スタブサーバー
+# weather.py を NWS_API_BASE=http://127.0.0.1:8765 で起動すると本物のAPIの代わりに使える
+#
+# 合成データを返すほか、本物のAPIのレスポンスを記録（--record）して再生（--fixtures）できる
+#   uv run python nws_stub_server.py --fixtures fixtures/nws --record
+#   uv run python nws_stub_server.py --fixtures fixtures/nws --latency 0.05 --error-rate 0.01
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from collections import Counter
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8765
+NWS_UPSTREAM = "https://api.weather.gov"
+
+# (event, severity, urgency) の組み合わせを順番に割り当てる
+STUB_ALERT_KINDS = [
+    ("Wind Advisory", "Moderate", "Expected"),
+    ("Winter Storm Warning", "Severe", "Expected"),
+    ("Flash Flood Warning", "Severe", "Immediate"),
+    ("Special Weather Statement", "Minor", "Future"),
+]
+
+
+def request_kind(path: str) -> str:
+    """リクエスト数を集計するためのエンドポイント種別。"""
+    if path.startswith("/points/"):
+        return "points"
+    if path.startswith("/gridpoints/"):
+        return "forecast"
+    if path.startswith("/alerts"):
+        return "alerts"
+    return "other"
+
+
+class NWSStub:
+    """/points, /gridpoints/.../forecast, /alerts を返すスタブ。
+
+    - latency / jitter: 各リクエストに加える遅延（秒）。jitter は 0〜jitter の一様乱数
+    - error_rate: この割合のリクエストに 503 を返す
+    - fixtures: 記録済みレスポンスのディレクトリ。指定すると合成データの代わりに再生する
+    - record: fixtures にないリクエストを upstream に転送して記録する
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        latency: float = 0.0,
+        alert_count: int = 3,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        fixtures: str | None = None,
+        record: bool = False,
+        upstream: str = NWS_UPSTREAM,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.latency = latency
+        self.alert_count = alert_count
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fixtures = Path(fixtures) if fixtures else None
+        self.record = record
+        self.upstream = upstream.rstrip("/")
+        self.request_counts: Counter[str] = Counter()
+
+    async def _admit(self, kind: str) -> Response | None:
+        """リクエストを数えて遅延を入れる。エラーを注入する場合はそのレスポンスを返す。"""
+        self.request_counts[kind] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            self.request_counts[f"{kind}_error"] += 1
+            return Response(status_code=503)
+        return None
+
+    def _json(self, request: Request, kind: str, payload: dict[str, Any]) -> Response:
+        return self._respond(request, kind, json.dumps(payload).encode())
+
+    def _respond(self, request: Request, kind: str, body: bytes) -> Response:
+        """ETagを付けて返す。If-None-Match が一致すれば 304 を返す。"""
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if request.headers.get("if-none-match") == etag:
+            self.request_counts[f"{kind}_304"] += 1
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/geo+json", headers={"ETag": etag})
+
+    async def points(self, request: Request) -> Response:
+        if (error := await self._admit("points")) is not None:
+            return error
+        lat, lon = (float(v) for v in request.path_params["coords"].split(","))
+        x, y = int(lat * 10) % 100, int(lon * 10) % 100
+        grid = f"{self.base_url}/gridpoints/STB/{x},{y}"
+        return self._json(
+            request,
+            "points",
+            {
+                "properties": {
+                    "gridId": "STB",
+                    "gridX": x,
+                    "gridY": y,
+                    "forecast": f"{grid}/forecast",
+                    "forecastHourly": f"{grid}/forecast/hourly",
+                }
+            },
+        )
+
+    async def forecast(self, request: Request) -> Response:
+        if (error := await self._admit("forecast")) is not None:
+            return error
+        periods = [
+            {
+                "number": i + 1,
+                "name": f"Period {i + 1}",
+                "temperature": 60 + i,
+                "temperatureUnit": "F",
+                "windSpeed": "10 mph",
+                "windDirection": "NW",
+                "shortForecast": "Sunny",
+                "detailedForecast": "Sunny, with a high near 60. Northwest wind around 10 mph.",
+            }
+            for i in range(14)
+        ]
+        return self._json(request, "forecast", {"properties": {"periods": periods}})
+
+    def _alert_features(self, state: str) -> list[dict[str, Any]]:
+        features = []
+        for i in range(self.alert_count):
+            event, severity, urgency = STUB_ALERT_KINDS[i % len(STUB_ALERT_KINDS)]
+            features.append(
+                {
+                    "id": f"urn:oid:stub.{state}.{i}",
+                    "properties": {
+                        "id": f"urn:oid:stub.{state}.{i}",
+                        "event": event,
+                        "areaDesc": f"Zone {i}, {state}",
+                        "severity": severity,
+                        "urgency": urgency,
+                        "description": "Southwest winds 25 to 35 mph with gusts up to 50 mph.",
+                        "instruction": "Use extra caution when driving.",
+                    },
+                }
+            )
+        return features
+
+    async def alerts(self, request: Request) -> Response:
+        if (error := await self._admit("alerts")) is not None:
+            return error
+        state = request.path_params["state"]
+        return self._json(request, "alerts", {"features": self._alert_features(state)})
+
+    async def alerts_query(self, request: Request) -> Response:
+        """/alerts/active?area=CA,NV&severity=Severe のような絞り込みに対応する。"""
+        if (error := await self._admit("alerts")) is not None:
+            return error
+        filters = {
+            key: set(request.query_params[key].split(","))
+            for key in ("severity", "event", "urgency")
+            if key in request.query_params
+        }
+        features = [
+            feature
+            for state in request.query_params.get("area", "").split(",")
+            if state
+            for feature in self._alert_features(state)
+            if all(feature["properties"][key] in values for key, values in filters.items())
+        ]
+        return self._json(request, "alerts", {"features": features})
+
+    def _fixture_path(self, request: Request) -> Path:
+        assert self.fixtures is not None
+        target = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        return self.fixtures / f"{quote(target, safe='')}.json"
+
+    async def _record(self, request: Request, path: Path) -> bytes | None:
+        url = f"{self.upstream}{request.url.path}"
+        headers = {"User-Agent": "weather-app-stub/1.0", "Accept": "application/geo+json"}
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            response = await client.get(url, params=request.query_params, headers=headers)
+        if response.status_code != 200:
+            return None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(response.content)
+        return response.content
+
+    async def replay(self, request: Request) -> Response:
+        """記録済みのレスポンスを返す。本物のAPIを指すURLはスタブのURLに書き換える。"""
+        kind = request_kind(request.url.path)
+        if (error := await self._admit(kind)) is not None:
+            return error
+        path = self._fixture_path(request)
+        if path.exists():
+            body = path.read_bytes()
+        elif self.record and (recorded := await self._record(request, path)) is not None:
+            body = recorded
+        else:
+            return Response(status_code=404)
+        return self._respond(request, kind, body.replace(self.upstream.encode(), self.base_url.encode()))
+
+    async def stats(self, request: Request) -> JSONResponse:
+        return JSONResponse(dict(self.request_counts))
+
+    def app(self) -> Starlette:
+        if self.fixtures is not None:
+            routes = [Route("/{path:path}", self.replay)]
+        else:
+            routes = [
+                Route("/points/{coords}", self.points),
+                Route("/gridpoints/{office}/{grid}/forecast", self.forecast),
+                Route("/alerts/active/area/{state}", self.alerts),
+                Route("/alerts/active", self.alerts_query),
+            ]
+        return Starlette(routes=[Route("/__stats", self.stats), *routes])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NWS API stub server")
+    parser.add_argument("--host", default=STUB_HOST)
+    parser.add_argument("--port", type=int, default=STUB_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="各リクエストに加える遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に加える0〜jitter秒の揺らぎ")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503を返すリクエストの割合")
+    parser.add_argument("--alerts", type=int, default=3, help="州ごとに返すアラート件数（合成データ）")
+    parser.add_argument("--fixtures", help="記録済みレスポンスのディレクトリ")
+    parser.add_argument("--record", action="store_true", help="fixturesにないリクエストを本物のAPIから記録する")
+    parser.add_argument("--upstream", default=NWS_UPSTREAM)
+    args = parser.parse_args()
+    stub = NWSStub(
+        f"http://{args.host}:{args.port}",
+        latency=args.latency,
+        alert_count=args.alerts,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        fixtures=args.fixtures,
+        record=args.record,
+        upstream=args.upstream,
+    )
+    uvicorn.run(stub.app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
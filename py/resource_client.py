@@ -7,10 +7,20 @@ from mcp import types
 STREAMABLE_HTTP_URL = "http://127.0.0.1:8000/mcp"
 
 async def main() -> None:
+    history_updated = asyncio.Event()
+
+    # 購読したリソースの更新通知を受け取る
+    async def message_handler(message) -> None:
+        if isinstance(message, types.ServerNotification):
+            print("Notification:", message.root)
+            if isinstance(message.root, types.ResourceUpdatedNotification):
+                history_updated.set()
+
     async with streamable_http_client(STREAMABLE_HTTP_URL) as (read, write, get_session_id):
         async with ClientSession(
             read,
             write,
+            message_handler=message_handler,
         ) as session:
             await session.initialize()
 
@@ -22,10 +32,14 @@ async def main() -> None:
             print("Available tools raw:", response.tools)
             print("---")
 
+            # 履歴を購読しておくと、計算後に読み直して確かめなくても更新が通知される
+            await session.subscribe_resource(types.AnyUrl("calculator://history"))
             result = await session.call_tool("calculator_sum", {
                 "numbers": [1,2,3]
             })
             print("  tools:", result)
+            await asyncio.wait_for(history_updated.wait(), timeout=5)
+            print("---")
 
             # Resourceの一覧を取得
             resources = await session.list_resources()
@@ -1,9 +1,58 @@
+import atexit
+import json
+import os
+from urllib.parse import parse_qs
+
 from mcp.server.fastmcp import FastMCP, Context
 from mcp.server.fastmcp.utilities.logging import get_logger
 from pydantic import BaseModel
+
+from calc_history import HistoryRenderer, HistoryStore, MemoryHistory, SQLiteHistory
+from calc_history_notify import HistoryNotifier
+from resource_subscriptions import ResourceSubscriptions
+
 logger = get_logger("FastMCP.Server")
 mcp = FastMCP("CalculatorMCPServer", host="127.0.0.1", port=8000)
-calculation_history = []
+
+# 計算履歴は最新の CALC_HISTORY_CAPACITY 件（入力の合計 CALC_HISTORY_MAX_BYTES バイト）まで保持する
+CALC_HISTORY_CAPACITY = int(os.getenv("CALC_HISTORY_CAPACITY", "10000"))
+CALC_HISTORY_MAX_BYTES = int(os.getenv("CALC_HISTORY_MAX_BYTES", str(8 * 1024 * 1024)))
+# CALC_HISTORY_BACKEND=sqlite にすると履歴を CALC_HISTORY_DB に保存し、再起動後や複数ワーカー間で共有する
+CALC_HISTORY_BACKEND = os.getenv("CALC_HISTORY_BACKEND", "memory")
+CALC_HISTORY_DB = os.getenv("CALC_HISTORY_DB", "calc_history.sqlite3")
+CALC_HISTORY_FLUSH_INTERVAL = float(os.getenv("CALC_HISTORY_FLUSH_INTERVAL", "0.05"))
+CALC_HISTORY_BATCH_SIZE = int(os.getenv("CALC_HISTORY_BATCH_SIZE", "256"))
+# 1回の読み出しで返す件数（calculator://history は最新の CALC_HISTORY_MAX_LIMIT 件だけを返す）
+CALC_HISTORY_PAGE_LIMIT = int(os.getenv("CALC_HISTORY_PAGE_LIMIT", "100"))
+CALC_HISTORY_MAX_LIMIT = int(os.getenv("CALC_HISTORY_MAX_LIMIT", "1000"))
+# レンダリング済みの行をキャッシュする件数
+CALC_HISTORY_RENDER_CACHE = int(os.getenv("CALC_HISTORY_RENDER_CACHE", "10000"))
+# 履歴の更新通知をまとめる秒数（0 なら計算のたびにすぐ通知する）
+CALC_HISTORY_NOTIFY_WINDOW = float(os.getenv("CALC_HISTORY_NOTIFY_WINDOW", "0.05"))
+
+
+def create_history_store() -> HistoryStore:
+    if CALC_HISTORY_BACKEND == "sqlite":
+        store = SQLiteHistory(
+            CALC_HISTORY_DB,
+            capacity=CALC_HISTORY_CAPACITY,
+            batch_size=CALC_HISTORY_BATCH_SIZE,
+            flush_interval=CALC_HISTORY_FLUSH_INTERVAL,
+        )
+        # 終了時にまだ書き込んでいない履歴を書き込む
+        atexit.register(store.close)
+        return store
+    if CALC_HISTORY_BACKEND != "memory":
+        raise ValueError(f"unknown CALC_HISTORY_BACKEND: {CALC_HISTORY_BACKEND}")
+    return MemoryHistory(CALC_HISTORY_CAPACITY, CALC_HISTORY_MAX_BYTES)
+
+
+calculation_history = create_history_store()
+history_renderer = HistoryRenderer(calculation_history, max(CALC_HISTORY_RENDER_CACHE, CALC_HISTORY_MAX_LIMIT))
+# calculator://history* を resources/subscribe で購読すると、計算のたびに読み直さなくても更新が通知される
+subscriptions = ResourceSubscriptions()
+subscriptions.install(mcp, list_changed=True)
+history_notifier = HistoryNotifier(calculation_history, subscriptions, window=CALC_HISTORY_NOTIFY_WINDOW)
 
 class CalculatorResult(BaseModel):
     input: list[float]
@@ -11,23 +60,70 @@ class CalculatorResult(BaseModel):
 
 @mcp.resource("calculator://history")
 async def get_history() -> str:
-    """これまでの計算履歴を返す。"""
+    """これまでの計算履歴（最新の CALC_HISTORY_MAX_LIMIT 件）を返す。"""
     logger.info('get_history called')
-    if not calculation_history:
+    first, end = await calculation_history.bounds()
+    if first == end:
         return "No calculations yet."
-    return "\n".join(calculation_history)
+    start = max(first, end - CALC_HISTORY_MAX_LIMIT)
+    lines = [line for _, line in await history_renderer.lines(start, end, (first, end))]
+    if start > first:
+        lines.insert(0, f"({start - first} earlier calculations omitted; "
+                        f"read calculator://history?cursor={first} for older entries)")
+    return "\n".join(lines)
 
 @mcp.resource("calculator://history/{index}")
 async def get_history_item(index: int) -> str:
-    """履歴の特定インデックスを返す。"""
+    """履歴の特定インデックスを返す。
+
+    index は最初の計算からの通し番号で、容量を超えて押し出された番号は返せない。
+    """
     logger.info('get_history_item called with index: %d', index)
-    if not calculation_history:
+    record = await calculation_history.get(index)
+    if record is not None:
+        return record.render()
+
+    first, next_index = await calculation_history.bounds()
+    if first == next_index:
         return "No calculations yet."
+    if 0 <= index < first:
+        return f"Index {index} has been evicted from history."
+    return f"Index {index} is out of range."
+
+@mcp.resource("calculator://history/{start}/{end}")
+async def get_history_range(start: int, end: int) -> str:
+    """通し番号 start 以上 end 未満の履歴を返す（最大 CALC_HISTORY_MAX_LIMIT 件）。"""
+    logger.info('get_history_range called with start: %d end: %d', start, end)
+    lines = await history_renderer.lines(start, min(end, start + CALC_HISTORY_MAX_LIMIT))
+    if not lines:
+        return f"No calculations in range {start}-{end}."
+    return "\n".join(line for _, line in lines)
 
-    if index < 0 or index >= len(calculation_history):
-        return f"Index {index} is out of range."
+# FastMCP のテンプレートはクエリ文字列を変数にできないので、"?..." 全体を query として受け取る
+@mcp.resource("calculator://history{query}", mime_type="application/json")
+async def get_history_page(query: str) -> str:
+    """calculator://history?cursor=…&limit=… で履歴をページごとに返す。
 
-    return calculation_history[index]
+    cursor は通し番号で、省略すると最も古い履歴から返す。
+    続きは返した next_cursor を cursor に指定して読む（新しい計算が増えるまでは空のページになる）。
+    """
+    logger.info('get_history_page called with query: %s', query)
+    if not query.startswith("?"):
+        raise ValueError(f"Unknown resource: calculator://history{query}")
+    params = parse_qs(query[1:])
+    first, next_index = await calculation_history.bounds()
+    cursor = int(params.get("cursor", [first])[0])
+    limit = min(max(int(params.get("limit", [CALC_HISTORY_PAGE_LIMIT])[0]), 1), CALC_HISTORY_MAX_LIMIT)
+    start = max(cursor, first)
+    end = min(start + limit, next_index)
+    lines = await history_renderer.lines(start, end, (first, next_index))
+    return json.dumps({
+        "entries": [{"index": index, "text": line} for index, line in lines],
+        "next_cursor": str(max(end, cursor)),
+        "has_more": end < next_index,
+        "first_index": first,
+        "next_index": next_index,
+    })
 
 @mcp.prompt()
 async def calc_with_history(numbers: str) -> str:
@@ -54,7 +150,12 @@ async def calculator_sum(numbers: list[float], ctx: Context) -> CalculatorResult
     logger.info(f"calculator_sum called with numbers: {numbers} ")
     total = sum(numbers)
     logger.info(f"calculator_sum result {total} ")
-    calculation_history.append(f"{numbers} is {total}")
+    try:
+        calculation_history.append(numbers, total)
+    except ValueError as e:
+        # 履歴に入りきらない大きな入力でも計算結果は返す
+        logger.warning("calculator_sum result not recorded: %s", e)
+    await history_notifier.changed()
     return CalculatorResult(
         input = numbers,
         total = total
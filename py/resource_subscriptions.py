@@ -0,0 +1,87 @@
+# FastMCPサーバーに resources/subscribe を追加し、購読中のセッションへ更新通知を送る
+from typing import Any
+
+from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp.utilities.logging import get_logger
+from mcp.server.lowlevel.server import NotificationOptions
+from mcp.server.session import ServerSession
+from pydantic import AnyUrl
+
+logger = get_logger("FastMCP.Server")
+
+
+class ResourceSubscriptions:
+    """URIごとに購読しているセッションを管理する。
+
+    FastMCP は resources/subscribe のハンドラを持たないため、
+    install() で低レベルサーバーにハンドラを登録し、capability に subscribe を立てる。
+    """
+
+    def __init__(self) -> None:
+        self._sessions: dict[str, set[ServerSession]] = {}
+
+    def install(self, mcp: FastMCP, list_changed: bool = False) -> None:
+        """list_changed=True なら capability に resources.listChanged も立てる（notify_list_changed() を使うとき）。"""
+        server = mcp._mcp_server
+
+        @server.subscribe_resource()
+        async def subscribe(uri: AnyUrl) -> None:
+            self.subscribe(str(uri), mcp.get_context().session)
+
+        @server.unsubscribe_resource()
+        async def unsubscribe(uri: AnyUrl) -> None:
+            self.unsubscribe(str(uri), mcp.get_context().session)
+
+        get_capabilities = server.get_capabilities
+
+        def get_capabilities_with_subscribe(
+            notification_options: NotificationOptions,
+            experimental_capabilities: dict[str, dict[str, Any]],
+        ):
+            capabilities = get_capabilities(notification_options, experimental_capabilities)
+            if capabilities.resources is not None:
+                capabilities.resources.subscribe = True
+                if list_changed:
+                    capabilities.resources.listChanged = True
+            return capabilities
+
+        server.get_capabilities = get_capabilities_with_subscribe
+
+    def subscribe(self, uri: str, session: ServerSession) -> None:
+        logger.debug("subscribe %s", uri)
+        self._sessions.setdefault(uri, set()).add(session)
+
+    def unsubscribe(self, uri: str, session: ServerSession) -> None:
+        logger.debug("unsubscribe %s", uri)
+        sessions = self._sessions.get(uri)
+        if sessions is None:
+            return
+        sessions.discard(session)
+        if not sessions:
+            del self._sessions[uri]
+
+    def uris(self) -> list[str]:
+        return list(self._sessions)
+
+    def sessions(self) -> set[ServerSession]:
+        return set().union(*self._sessions.values())
+
+    async def notify_updated(self, uri: str) -> None:
+        """uri を購読しているセッションに notifications/resources/updated を送る。"""
+        for session in list(self._sessions.get(uri, ())):
+            try:
+                await session.send_resource_updated(AnyUrl(uri))
+            except Exception as e:
+                # 切断されたセッションは購読から外す
+                logger.info("drop subscriber of %s: %s", uri, e)
+                self.unsubscribe(uri, session)
+
+    async def notify_list_changed(self) -> None:
+        """いずれかのURIを購読しているセッションに notifications/resources/list_changed を送る。"""
+        for session in self.sessions():
+            try:
+                await session.send_resource_list_changed()
+            except Exception as e:
+                logger.info("drop subscriber: %s", e)
+                for uri in self.uris():
+                    self.unsubscribe(uri, session)
@@ -0,0 +1,70 @@
+# 同じキーに対する同時実行中の非同期処理を1回にまとめる（single-flight）
+import asyncio
+from collections.abc import Awaitable, Callable, Coroutine
+from dataclasses import dataclass
+from typing import Any, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Flight(Generic[T]):
+    task: asyncio.Task[T]
+    waiters: int = 0
+
+
+class SingleFlight(Generic[T]):
+    """キーごとに実行中の処理を1つだけ持ち、後続の呼び出し元は同じ結果を待つ。
+
+    - 最初の呼び出し元の処理は別タスクで実行するため、その呼び出し元が
+      キャンセルされても他の待機者には影響しない
+    - 待機者が全員キャンセルされたら処理自体もキャンセルする
+    - 例外は待機者全員に伝播する
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[str, _Flight[T]] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        result, _ = self.start(key, fn)
+        return await result
+
+    def start(self, key: str, fn: Callable[[], Awaitable[T]]) -> tuple[Coroutine[Any, Any, T], bool]:
+        """do() と同じく処理を始めるか合流し、結果を待つコルーチンと、この呼び出しが処理を始めたかを返す。
+
+        処理の登録は呼び出した時点で済むので、返したコルーチンを await する前に
+        同じキーで呼ばれても新しい処理は始まらない。
+        """
+        self.calls += 1
+        flight = self._flights.get(key)
+        started = flight is None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.coalesced += 1
+        return self._wait(flight), started
+
+    async def _wait(self, flight: _Flight[T]) -> T:
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: str, flight: _Flight[T]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # 待機者がいないまま失敗した場合の "exception was never retrieved" を防ぐ
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def snapshot(self) -> dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._flights)}
@@ -1,97 +1,620 @@
 # 以下を元に構築
 # https://github.com/modelcontextprotocol/quickstart-resources/blob/main/weather-server-python/weather.py
-from typing import Any
+import asyncio
+import json
+import os
+import time
+from collections.abc import AsyncIterator, Iterable
+from contextlib import aclosing, asynccontextmanager
+from typing import Annotated, Any
 
 import httpx
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.types import CallToolResult, TextContent
+from pydantic import BaseModel, Field
 
-# FastMCPサーバーの初期化
-mcp = FastMCP("weather")
+from nws_cache import CacheEntry, ResponseCache
+from nws_format import (
+    AlertsResult,
+    AlertSummary,
+    Detail,
+    ForecastBatchResult,
+    ForecastResult,
+    Periods,
+    alert_separator,
+    format_alert,
+    format_periods,
+    summarize_alert,
+    summarize_period,
+    tool_result,
+)
+from nws_gridpoints import Gridpoint, GridpointStore
+from nws_alert_query import AlertQuery
+from nws_alert_watch import AlertWatcher
+from nws_hot_alerts import HotAlertRefresher
+from nws_resilience import CircuitBreaker, LatencyTracker, ResilientFetcher
+from nws_stream import FeatureStreamParser
+from resource_subscriptions import ResourceSubscriptions
+from singleflight import SingleFlight
 
 # 定数
-NWS_API_BASE = "https://api.weather.gov"
+NWS_API_BASE = os.getenv("NWS_API_BASE", "https://api.weather.gov")
 USER_AGENT = "weather-app/1.0"
+NWS_HEADERS = {"User-Agent": USER_AGENT, "Accept": "application/geo+json"}
+NWS_TIMEOUT = float(os.getenv("NWS_TIMEOUT", "30.0"))
+
+# 上流の遅延・障害への対策
+# タイムアウトは直近のp99×倍率を [NWS_TIMEOUT_MIN, NWS_TIMEOUT] に収めた値
+NWS_TIMEOUT_MIN = float(os.getenv("NWS_TIMEOUT_MIN", "1.0"))
+NWS_TIMEOUT_P99_MULTIPLIER = float(os.getenv("NWS_TIMEOUT_P99_MULTIPLIER", "3.0"))
+# このパーセンタイルの時間を過ぎても応答がなければ同じリクエストをもう1本送る（空で無効）
+NWS_HEDGE_PERCENTILE = float(os.getenv("NWS_HEDGE_PERCENTILE") or 0) or None
+NWS_RETRIES = int(os.getenv("NWS_RETRIES", "2"))
+# リトライを含めた1回の取得にかける時間の上限（秒）
+NWS_DEADLINE = float(os.getenv("NWS_DEADLINE", "10.0"))
+NWS_RETRY_BACKOFF = float(os.getenv("NWS_RETRY_BACKOFF", "0.2"))
+NWS_BREAKER_FAILURES = int(os.getenv("NWS_BREAKER_FAILURES", "5"))
+NWS_BREAKER_RESET = float(os.getenv("NWS_BREAKER_RESET", "30"))
+
+# コネクションプールの設定（環境変数で上書き可能）
+NWS_MAX_CONNECTIONS = int(os.getenv("NWS_MAX_CONNECTIONS", "100"))
+NWS_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("NWS_MAX_KEEPALIVE_CONNECTIONS", "20"))
+NWS_KEEPALIVE_EXPIRY = float(os.getenv("NWS_KEEPALIVE_EXPIRY", "30.0"))
+# HTTP/2 で1本の接続にリクエストを多重化する（httpx[http2] の h2 を使う）。NWS_HTTP2=0 で HTTP/1.1 にする
+NWS_HTTP2 = os.getenv("NWS_HTTP2", "1") == "1"
+
+# レスポンスキャッシュの設定
+# /points のメタデータはほぼ変わらず、予報は1時間ごと、アラートは頻繁に更新される
+NWS_CACHE_TTLS = {
+    "/points/": float(os.getenv("NWS_CACHE_TTL_POINTS", "86400")),
+    "/alerts/": float(os.getenv("NWS_CACHE_TTL_ALERTS", "60")),
+    "/gridpoints/": float(os.getenv("NWS_CACHE_TTL_FORECAST", "900")),
+}
+NWS_CACHE_MAX_ENTRIES = int(os.getenv("NWS_CACHE_MAX_ENTRIES", "1024"))
+NWS_CACHE_MAX_BYTES = int(os.getenv("NWS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# 緯度経度 → 予報URL の永続キャッシュ（空文字で無効化）
+NWS_GRIDPOINT_DB = os.getenv("NWS_GRIDPOINT_DB", "nws_gridpoints.sqlite3")
+NWS_GRIDPOINT_PRECISION = int(os.getenv("NWS_GRIDPOINT_PRECISION", "4"))
+
+# get_forecasts で同時に投げるNWSリクエスト数の上限
+NWS_BATCH_CONCURRENCY = int(os.getenv("NWS_BATCH_CONCURRENCY", "8"))
+
+# よく問い合わせられる州のアラートを先読みする設定（NWS_HOT_STATES=0 で無効化）
+NWS_HOT_STATES = int(os.getenv("NWS_HOT_STATES", "10"))
+NWS_HOT_REFRESH_INTERVAL = float(os.getenv("NWS_HOT_REFRESH_INTERVAL", "60"))
+NWS_HOT_MAX_STALE = float(os.getenv("NWS_HOT_MAX_STALE", "300"))
+
+# get_alerts の出力サイズ上限（文字数）と、途中経過を通知するアラート件数
+NWS_ALERTS_MAX_CHARS = int(os.getenv("NWS_ALERTS_MAX_CHARS", "100000"))
+NWS_ALERTS_PROGRESS_BATCH = int(os.getenv("NWS_ALERTS_PROGRESS_BATCH", "10"))
+# ストリーミング取得したアラートをキャッシュに残すレスポンスサイズの上限（バイト）
+NWS_ALERTS_STREAM_CACHE_MAX_BYTES = int(os.getenv("NWS_ALERTS_STREAM_CACHE_MAX_BYTES", str(1024 * 1024)))
+
+# 購読されているアラートの変化を確認する間隔（秒）
+NWS_ALERT_WATCH_INTERVAL = float(os.getenv("NWS_ALERT_WATCH_INTERVAL", "60"))
+
+# サーバーの生存期間中に共有するHTTPクライアント（lifespanで生成）
+_http_client: httpx.AsyncClient | None = None
+_gridpoint_store: GridpointStore | None = None
+response_cache = ResponseCache(
+    NWS_CACHE_TTLS,
+    max_entries=NWS_CACHE_MAX_ENTRIES,
+    max_bytes=NWS_CACHE_MAX_BYTES,
+)
+# 同じURLへの同時リクエストを1本にまとめる
+_inflight: SingleFlight[dict[str, Any] | None] = SingleFlight()
+nws_breaker = CircuitBreaker(failure_threshold=NWS_BREAKER_FAILURES, reset_timeout=NWS_BREAKER_RESET)
+nws_fetcher = ResilientFetcher(
+    nws_breaker,
+    LatencyTracker(),
+    max_timeout=NWS_TIMEOUT,
+    min_timeout=NWS_TIMEOUT_MIN,
+    timeout_multiplier=NWS_TIMEOUT_P99_MULTIPLIER,
+    hedge_percentile=NWS_HEDGE_PERCENTILE,
+    retries=NWS_RETRIES,
+    backoff=NWS_RETRY_BACKOFF,
+    deadline=NWS_DEADLINE,
+)
+
+
+def create_nws_client() -> httpx.AsyncClient:
+    """NWS API用のコネクションプール付きHTTPクライアントを生成する。"""
+    return httpx.AsyncClient(
+        headers=NWS_HEADERS,
+        timeout=NWS_TIMEOUT,
+        http2=NWS_HTTP2,
+        limits=httpx.Limits(
+            max_connections=NWS_MAX_CONNECTIONS,
+            max_keepalive_connections=NWS_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=NWS_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """サーバー起動時にHTTPクライアントとグリッドキャッシュを開き、アラートの先読みを始める。"""
+    global _http_client, _gridpoint_store
+    _http_client = create_nws_client()
+    if NWS_GRIDPOINT_DB:
+        _gridpoint_store = GridpointStore(NWS_GRIDPOINT_DB, precision=NWS_GRIDPOINT_PRECISION)
+    if NWS_HOT_STATES > 0:
+        hot_alerts.start()
+    alert_watcher.start()
+    try:
+        yield
+    finally:
+        await alert_watcher.stop()
+        await hot_alerts.stop()
+        await _http_client.aclose()
+        _http_client = None
+        if _gridpoint_store is not None:
+            _gridpoint_store.close()
+            _gridpoint_store = None
+
+
+# FastMCPサーバーの初期化
+mcp = FastMCP("weather", lifespan=lifespan)
+
+
+async def make_nws_request(url: str, allow_stale: bool = True) -> dict[str, Any] | None:
+    """NWS APIにリクエストを送信し、適切なエラーハンドリングを行う。
+
+    上流が失敗した（またはブレーカーが開いている）ときは、allow_stale なら期限切れのキャッシュを返し、
+    そうでなければ None を返す。
+    """
+    if _http_client is None:
+        # lifespan外（スクリプトからの直接呼び出しなど）では使い捨てのクライアントを使う
+        async with create_nws_client() as client:
+            return await _get_json(client, url, allow_stale)
+    return await _get_json(_http_client, url, allow_stale)
+
+
+async def _get_json(client: httpx.AsyncClient, url: str, allow_stale: bool) -> dict[str, Any] | None:
+    entry = response_cache.lookup(url)
+    if entry is not None and entry.is_fresh(time.monotonic()):
+        return entry.data
+    try:
+        data = await _inflight.do(url, lambda: _fetch_json(client, url, entry))
+    except Exception:
+        # ストリーミングの取得（_stream_alerts）に相乗りして失敗したとき
+        data = None
+    if data is None and allow_stale and entry is not None:
+        return entry.data
+    return data
+
 
+async def _fetch_json(client: httpx.AsyncClient, url: str, entry: CacheEntry | None) -> dict[str, Any] | None:
+    """取得（または 304 で再検証）できたレスポンスを返す。失敗したら None。"""
+    try:
+        # 期限切れのエントリがあれば条件付きリクエストで再検証する
+        headers = entry.validators() if entry is not None else {}
+        response = await nws_fetcher.get(client, url, headers)
+        if entry is not None and response.status_code == 304:
+            response_cache.refresh(url, entry)
+            return entry.data
+        response.raise_for_status()
+        data = response.json()
+    except Exception:
+        return None
+    response_cache.store(
+        url,
+        data,
+        len(response.content),
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+    return data
 
-async def make_nws_request(url: str) -> dict[str, Any] | None:
-    """NWS APIにリクエストを送信し、適切なエラーハンドリングを行う。"""
-    headers = {"User-Agent": USER_AGENT, "Accept": "application/geo+json"}
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=30.0)
+
+def alerts_url(state: str) -> str:
+    return AlertQuery.create(state).url(NWS_API_BASE)
+
+
+async def fetch_state_alerts(state: str) -> dict[str, Any] | None:
+    """州のアクティブなアラートをNWS APIから取得する。
+
+    先読みと変更の監視で使うので、取得に失敗したときは古いキャッシュではなく None を返す。
+    """
+    return await make_nws_request(alerts_url(state), allow_stale=False)
+
+
+def cached_nws_data(entry: CacheEntry | None) -> dict[str, Any] | None:
+    """キャッシュのエントリが有効期限内ならそのレスポンスを返す（リクエストは送らない）。
+
+    サーキットブレーカーが開いている間は期限切れのレスポンスも返す。
+    """
+    if entry is not None and (entry.is_fresh(time.monotonic()) or nws_breaker.state == "open"):
+        return entry.data
+    return None
+
+
+async def stream_alert_features(
+    url: str,
+    entry: CacheEntry | None = None,
+    hot_state: str | None = None,
+) -> AsyncIterator[dict[str, Any]]:
+    """アラートをレスポンス全体を待たずに1件ずつ返す。
+
+    同じURLの取得（make_nws_request を含む）が進行中なら、新しくリクエストを送らずにその結果を返す。
+    期限切れのキャッシュ entry があれば条件付きリクエストにし、304 ならキャッシュの features を返す。
+    """
+    queue: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+    result, started = _inflight.start(url, lambda: _stream_alerts(url, entry, hot_state, queue))
+    waiter = asyncio.ensure_future(result)
+    try:
+        if not started:
+            data = await waiter
+            if data is None or "features" not in data:
+                raise ValueError(f"alerts unavailable: {url}")
+            for feature in data["features"]:
+                yield feature
+            return
+        while (feature := await queue.get()) is not None:
+            yield feature
+        await waiter
+    finally:
+        # 途中で読むのをやめたときは待つのをやめる（他に待っている呼び出し元がいなければ取得も止まる）
+        waiter.cancel()
+
+
+async def _stream_alerts(
+    url: str,
+    entry: CacheEntry | None,
+    hot_state: str | None,
+    queue: asyncio.Queue[dict[str, Any] | None],
+) -> dict[str, Any] | None:
+    """読んだ feature を queue に入れながらアラートを取得し、最後に None を入れる。
+
+    single-flight で待っている他の呼び出し元にはレスポンス全体を返す。
+    NWS_ALERTS_STREAM_CACHE_MAX_BYTES を超えるレスポンスは保持しないので None を返す。
+    """
+    try:
+        with nws_breaker.guard(url):
+            return await _read_alert_stream(url, entry, hot_state, queue)
+    finally:
+        queue.put_nowait(None)
+
+
+async def _read_alert_stream(
+    url: str,
+    entry: CacheEntry | None,
+    hot_state: str | None,
+    queue: asyncio.Queue[dict[str, Any] | None],
+) -> dict[str, Any] | None:
+    client = _http_client or create_nws_client()
+    headers = entry.validators() if entry is not None else {}
+    try:
+        # httpx の timeout は接続・読み込みの1回ごとなので、少しずつ届くレスポンスも deadline で打ち切る
+        async with (
+            asyncio.timeout(nws_fetcher.deadline),
+            client.stream("GET", url, headers=headers, timeout=nws_fetcher.timeout()) as response,
+        ):
+            nws_breaker.record_status(response.status_code)
+            if entry is not None and response.status_code == 304:
+                response_cache.refresh(url, entry)
+                for feature in entry.data.get("features", []):
+                    queue.put_nowait(feature)
+                return entry.data
             response.raise_for_status()
-            return response.json()
-        except Exception:
-            return None
+            parser = FeatureStreamParser()
+            kept = await _read_features(response, parser, queue)
+    except (httpx.TransportError, TimeoutError):
+        nws_breaker.record_failure()
+        raise
+    finally:
+        if client is not _http_client:
+            await client.aclose()
+    if kept is None:
+        return None
+    data = {"features": kept}
+    response_cache.store(
+        url,
+        data,
+        parser.bytes_read,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+    if hot_state is not None:
+        hot_alerts.remember(hot_state, data)
+    return data
+
+
+async def _read_features(
+    response: httpx.Response,
+    parser: FeatureStreamParser,
+    queue: asyncio.Queue[dict[str, Any] | None],
+) -> list[dict[str, Any]] | None:
+    """レスポンスの feature を queue に入れ、キャッシュできる大きさならそのリストも返す。"""
+    kept: list[dict[str, Any]] | None = []
+    async for chunk in response.aiter_bytes():
+        for feature in parser.feed(chunk):
+            if kept is not None:
+                kept.append(feature)
+            queue.put_nowait(feature)
+        if parser.bytes_read > NWS_ALERTS_STREAM_CACHE_MAX_BYTES:
+            kept = None
+    parser.close()
+    return kept
+
+
+async def _iterate(features: Iterable[dict[str, Any]]) -> AsyncIterator[dict[str, Any]]:
+    for feature in features:
+        yield feature
+
 
+hot_alerts = HotAlertRefresher(
+    fetch_state_alerts,
+    hot_size=NWS_HOT_STATES,
+    interval=NWS_HOT_REFRESH_INTERVAL,
+    max_stale=NWS_HOT_MAX_STALE,
+)
 
-def format_alert(feature: dict) -> str:
-    """アラート機能を読みやすい文字列にフォーマットする。"""
-    props = feature["properties"]
-    return f"""
-Event: {props.get("event", "Unknown")}
-Area: {props.get("areaDesc", "Unknown")}
-Severity: {props.get("severity", "Unknown")}
-Description: {props.get("description", "No description available")}
-Instructions: {props.get("instruction", "No specific instructions provided")}
-"""
+# weather://alerts/{state} の購読と変更通知
+subscriptions = ResourceSubscriptions()
+subscriptions.install(mcp)
+alert_watcher = AlertWatcher(fetch_state_alerts, subscriptions, interval=NWS_ALERT_WATCH_INTERVAL)
+
+
+async def render_alerts(
+    features: AsyncIterator[dict[str, Any]],
+    query: AlertQuery,
+    detail: Detail,
+    ctx: Context | None,
+    max_chars: int,
+) -> tuple[list[AlertSummary], list[str], bool]:
+    """アラートを1件ずつフォーマットし、一定件数ごとに途中経過として通知する。
+
+    条件に合わないアラートと、複数の州にまたがって重複したアラートは除く。
+    出力が max_chars を超えたらそこで読むのをやめ、打ち切ったかどうかも返す。
+    """
+    summaries: list[AlertSummary] = []
+    texts: list[str] = []
+    batch: list[str] = []
+    seen: set[str] = set()
+    separator = alert_separator(detail)
+    size = 0
+    async with aclosing(features) as stream:
+        async for feature in stream:
+            alert_id = feature.get("id") or feature["properties"].get("id")
+            if alert_id in seen or not query.matches(feature):
+                continue
+            if alert_id:
+                seen.add(alert_id)
+            summary = summarize_alert(feature, detail)
+            text = format_alert(summary, detail)
+            size += len(text) + len(separator)
+            if size > max_chars:
+                return summaries, texts, True
+            summaries.append(summary)
+            texts.append(text)
+            batch.append(text)
+            if ctx is not None and len(batch) >= NWS_ALERTS_PROGRESS_BATCH:
+                await ctx.report_progress(len(texts), message=separator.join(batch))
+                batch = []
+    return summaries, texts, False
+
+
+def alerts_message(message: str) -> CallToolResult:
+    return tool_result(message, AlertsResult(message=message))
 
 
 @mcp.tool()
-async def get_alerts(state: str) -> str:
+async def get_alerts(
+    state: str | list[str],
+    severity: list[str] | None = None,
+    event: list[str] | None = None,
+    urgency: list[str] | None = None,
+    detail: Detail = "normal",
+    ctx: Context | None = None,
+) -> Annotated[CallToolResult, AlertsResult]:
     """米国の州の天気アラートを取得する。
 
+    複数の州と絞り込み条件はまとめて1回のNWSリクエストで問い合わせる。
+
     Args:
-        state: 2文字の米国州コード（例：CA, NY）
+        state: 2文字の米国州コード（例：CA, NY）。リストまたはカンマ区切りで複数指定できる
+        severity: 重大度で絞り込む（例：Extreme, Severe, Moderate, Minor）
+        event: イベント名で絞り込む（例：Winter Storm Warning）
+        urgency: 緊急度で絞り込む（例：Immediate, Expected, Future）
+        detail: 出力の詳しさ。compact は1件1行で説明文を省く、full は時刻や確度も含める
     """
-    url = f"{NWS_API_BASE}/alerts/active/area/{state}"
-    data = await make_nws_request(url)
+    query = AlertQuery.create(state, severity=severity, event=event, urgency=urgency)
+    if not query.states:
+        return alerts_message("Unable to fetch alerts or no alerts found.")
+    url = query.url(NWS_API_BASE)
+    hot_state = query.single_state
+    data = hot_alerts.lookup(hot_state) if hot_state else None
+    entry = response_cache.lookup(url) if not data else None
+    data = data or cached_nws_data(entry)
+    if data is not None and "features" not in data:
+        return alerts_message("Unable to fetch alerts or no alerts found.")
+    # メモリ上になければNWSからストリーミングで読みながらフォーマットする
+    features = _iterate(data["features"]) if data is not None else stream_alert_features(url, entry, hot_state)
+
+    try:
+        summaries, texts, truncated = await render_alerts(features, query, detail, ctx, NWS_ALERTS_MAX_CHARS)
+    except Exception:
+        return alerts_message("Unable to fetch alerts or no alerts found.")
+
+    if not texts and not truncated:
+        return alerts_message("No active alerts for this state.")
+
+    separator = alert_separator(detail)
+    text = separator.join(texts)
+    message = None
+    if truncated:
+        message = f"Output truncated after {len(texts)} alerts ({NWS_ALERTS_MAX_CHARS} characters)."
+        text += f"{separator}{message}"
+    return tool_result(text, AlertsResult(alerts=summaries, truncated=truncated, message=message))
+
+
+@mcp.resource("weather://alerts/{state}")
+async def get_alerts_resource(state: str) -> str:
+    """米国の州の天気アラート。購読するとアラートが変わったときに通知される。"""
+    result = await get_alerts(state)
+    return result.content[0].text if isinstance(result.content[0], TextContent) else ""
+
+
+@mcp.resource("weather://alerts/{state}/delta", mime_type="application/json")
+async def get_alerts_delta(state: str) -> str:
+    """直近の変更で追加/削除されたアラートIDを返す。"""
+    return json.dumps(alert_watcher.delta(state).as_dict(state))
+
+
+async def resolve_gridpoint(latitude: float, longitude: float, refresh: bool = False) -> Gridpoint | None:
+    """位置の予報URLを返す。永続キャッシュになければ（refresh=True なら常に）/points に問い合わせる。"""
+    if not refresh and _gridpoint_store is not None and (gridpoint := await _gridpoint_store.get(latitude, longitude)):
+        return gridpoint
+
+    # 予報グリッドエンドポイントを取得
+    points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
+    points_data = await make_nws_request(points_url)
+    if not points_data:
+        return None
+
+    # ポイントレスポンスから予報URLを取得
+    properties = points_data["properties"]
+    gridpoint = Gridpoint(forecast=properties["forecast"], forecast_hourly=properties.get("forecastHourly"))
+    if _gridpoint_store is not None:
+        await _gridpoint_store.put(latitude, longitude, gridpoint)
+    return gridpoint
+
+
+async def fetch_forecast(latitude: float, longitude: float, gridpoint: Gridpoint) -> dict[str, Any] | None:
+    """予報URLから予報を取得する。"""
+    forecast_data = await make_nws_request(gridpoint.forecast)
+    if forecast_data or not gridpoint.cached or _gridpoint_store is None:
+        return forecast_data
+    # グリッドが変わった可能性があるので /points を引き直し、予報URLが変わっていれば保存し直す。
+    # /points も失敗した（NWSの障害やブレーカーが開いている）ときは保存済みのURLを残す
+    refreshed = await resolve_gridpoint(latitude, longitude, refresh=True)
+    if refreshed is None or refreshed.forecast == gridpoint.forecast:
+        return None
+    return await make_nws_request(refreshed.forecast)
 
-    if not data or "features" not in data:
-        return "Unable to fetch alerts or no alerts found."
 
-    if not data["features"]:
-        return "No active alerts for this state."
+def summarize_forecast(
+    latitude: float,
+    longitude: float,
+    forecast_data: dict[str, Any],
+    detail: Detail,
+    periods: int,
+) -> ForecastResult:
+    return ForecastResult(
+        latitude=latitude,
+        longitude=longitude,
+        periods=[summarize_period(p, detail) for p in forecast_data["properties"]["periods"][:periods]],
+    )
 
-    alerts = [format_alert(feature) for feature in data["features"]]
-    return "\n---\n".join(alerts)
+
+async def forecast_for(latitude: float, longitude: float, detail: Detail, periods: int) -> ForecastResult:
+    gridpoint = await resolve_gridpoint(latitude, longitude)
+    if gridpoint is None:
+        return ForecastResult(latitude=latitude, longitude=longitude, error="Unable to fetch forecast data for this location.")
+
+    forecast_data = await fetch_forecast(latitude, longitude, gridpoint)
+    if not forecast_data:
+        return ForecastResult(latitude=latitude, longitude=longitude, error="Unable to fetch detailed forecast.")
+
+    return summarize_forecast(latitude, longitude, forecast_data, detail, periods)
 
 
 @mcp.tool()
-async def get_forecast(latitude: float, longitude: float) -> str:
+async def get_forecast(
+    latitude: float,
+    longitude: float,
+    detail: Detail = "normal",
+    periods: Periods = 5,
+) -> Annotated[CallToolResult, ForecastResult]:
     """位置の天気予報を取得する。
 
     Args:
         latitude: 位置の緯度
         longitude: 位置の経度
+        detail: 出力の詳しさ。compact は1ピリオド1行の短い予報、full は時刻や降水確率も含める
+        periods: 表示するピリオド（半日単位）の数
     """
-    # まず予報グリッドエンドポイントを取得
-    points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
-    points_data = await make_nws_request(points_url)
+    result = await forecast_for(latitude, longitude, detail, periods)
+    return tool_result(result.error or format_periods(result.periods, detail), result)
 
-    if not points_data:
-        return "Unable to fetch forecast data for this location."
 
-    # ポイントレスポンスから予報URLを取得
-    forecast_url = points_data["properties"]["forecast"]
-    forecast_data = await make_nws_request(forecast_url)
+class Location(BaseModel):
+    latitude: float = Field(description="位置の緯度")
+    longitude: float = Field(description="位置の経度")
 
-    if not forecast_data:
-        return "Unable to fetch detailed forecast."
-
-    # ピリオドを読みやすい予報にフォーマット
-    periods = forecast_data["properties"]["periods"]
-    forecasts = []
-    for period in periods[:5]:  # 次の5つのピリオドのみを表示
-        forecast = f"""
-{period["name"]}:
-Temperature: {period["temperature"]}°{period["temperatureUnit"]}
-Wind: {period["windSpeed"]} {period["windDirection"]}
-Forecast: {period["detailedForecast"]}
-"""
-        forecasts.append(forecast)
-
-    return "\n---\n".join(forecasts)
+
+@mcp.tool()
+async def get_forecasts(
+    locations: list[Location],
+    max_concurrency: int | None = None,
+    detail: Detail = "normal",
+    periods: Periods = 5,
+) -> Annotated[CallToolResult, ForecastBatchResult]:
+    """複数の位置の天気予報をまとめて取得する。
+
+    同じ予報グリッドに属する位置は1回だけ取得する。
+
+    Args:
+        locations: 緯度経度のリスト
+        max_concurrency: NWSへの同時リクエスト数の上限（省略時はサーバー設定）
+        detail: 出力の詳しさ（compact / normal / full）
+        periods: 位置ごとに表示するピリオド（半日単位）の数
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or NWS_BATCH_CONCURRENCY))
+
+    async def resolve(location: Location) -> Gridpoint | None:
+        async with semaphore:
+            return await resolve_gridpoint(location.latitude, location.longitude)
+
+    async def fetch(location: Location, gridpoint: Gridpoint) -> dict[str, Any] | None:
+        async with semaphore:
+            return await fetch_forecast(location.latitude, location.longitude, gridpoint)
+
+    # 同じ座標の重複を除いてから予報URLを解決する
+    unique_locations = list({(loc.latitude, loc.longitude): loc for loc in locations}.values())
+    gridpoints = await asyncio.gather(*(resolve(loc) for loc in unique_locations))
+    gridpoint_by_coords = {
+        (loc.latitude, loc.longitude): gridpoint for loc, gridpoint in zip(unique_locations, gridpoints)
+    }
+
+    # 同じグリッド（予報URL）に解決された位置は代表の1件だけ取得する
+    representatives: dict[str, tuple[Location, Gridpoint]] = {}
+    for loc, gridpoint in zip(unique_locations, gridpoints):
+        if gridpoint is not None:
+            representatives.setdefault(gridpoint.forecast, (loc, gridpoint))
+    forecasts = await asyncio.gather(*(fetch(loc, gridpoint) for loc, gridpoint in representatives.values()))
+    forecast_by_url = dict(zip(representatives, forecasts))
+
+    results = []
+    sections = []
+    for index, loc in enumerate(locations, start=1):
+        gridpoint = gridpoint_by_coords[(loc.latitude, loc.longitude)]
+        if gridpoint is None:
+            result = ForecastResult(latitude=loc.latitude, longitude=loc.longitude, error="Unable to fetch forecast data for this location.")
+        elif not (forecast_data := forecast_by_url.get(gridpoint.forecast)):
+            result = ForecastResult(latitude=loc.latitude, longitude=loc.longitude, error="Unable to fetch detailed forecast.")
+        else:
+            result = summarize_forecast(loc.latitude, loc.longitude, forecast_data, detail, periods)
+        body = f"Error: {result.error}" if result.error else format_periods(result.periods, detail)
+        results.append(result)
+        sections.append(f"Location {index} ({loc.latitude}, {loc.longitude}):\n{body}")
+
+    return tool_result("\n===\n".join(sections), ForecastBatchResult(results=results))
+
+
+@mcp.resource("weather://cache/stats", mime_type="application/json")
+async def get_cache_stats() -> str:
+    """NWSレスポンスキャッシュのヒット/ミスや、まとめられたリクエスト数を返す。"""
+    return json.dumps(
+        {
+            **response_cache.snapshot(),
+            "inflight": _inflight.snapshot(),
+            "hot_alerts": hot_alerts.snapshot(),
+            "upstream": nws_fetcher.snapshot(),
+        }
+    )
 
 
 def main():
@@ -0,0 +1,176 @@
+# weather.py のNWS呼び出しレイテンシをスタブサーバー相手に計測する
+#
+# stdio: weather.py を別プロセスで起動し、MCPクライアントから get_alerts/get_forecast を呼ぶ
+#   uv run python weather_bench.py --requests 500 --concurrency 16 --latency 0.05
+#   uv run python weather_bench.py --fixtures fixtures/nws --workload alerts
+# pooling: 同一プロセス内で、リクエストごとのクライアント / プール / キャッシュを比較する
+#   uv run python weather_bench.py --scenario pooling --requests 200 --latency 0.005
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import uvicorn
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+import weather
+from bench_stats import report
+from nws_stub_server import STUB_HOST, STUB_PORT, NWSStub
+
+WEATHER_SERVER = Path(__file__).resolve().parent / "weather.py"
+
+# ベンチマークで問い合わせる位置と州（--record で記録するときもこの組み合わせになる）
+BENCH_LOCATIONS = [
+    (37.7749, -122.4194),
+    (34.0522, -118.2437),
+    (40.7128, -74.006),
+    (41.8781, -87.6298),
+    (29.7604, -95.3698),
+    (47.6062, -122.3321),
+    (39.7392, -104.9903),
+    (25.7617, -80.1918),
+]
+BENCH_STATES = ["CA", "NY", "TX", "FL", "WA", "CO", "IL"]
+
+
+def next_call(workload: str) -> tuple[str, dict]:
+    tool = workload if workload != "mixed" else random.choice(["alerts", "forecast"])
+    if tool == "alerts":
+        return "get_alerts", {"state": random.choice(BENCH_STATES)}
+    latitude, longitude = random.choice(BENCH_LOCATIONS)
+    return "get_forecast", {"latitude": latitude, "longitude": longitude}
+
+
+async def measure(session: ClientSession, args: argparse.Namespace) -> tuple[dict[str, list[float]], Counter[str], float]:
+    """args.concurrency 本の並列でツールを args.requests 回呼び出す。"""
+    samples: dict[str, list[float]] = {"get_alerts": [], "get_forecast": []}
+    errors: Counter[str] = Counter()
+    remaining = args.requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            name, arguments = next_call(args.workload)
+            t0 = time.perf_counter()
+            result = await session.call_tool(name, arguments)
+            samples[name].append(time.perf_counter() - t0)
+            text = result.content[0].text if result.content else ""
+            if result.isError or text.startswith("Unable"):
+                errors[name] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return samples, errors, time.perf_counter() - start
+
+
+async def run_stdio(args: argparse.Namespace, stub: NWSStub) -> None:
+    """weather.py をstdioで起動し、並列にツールを呼び出して計測する。"""
+    with tempfile.TemporaryDirectory() as tmp, open(args.server_log, "a") as errlog:
+        params = StdioServerParameters(
+            command=sys.executable,
+            args=[str(WEATHER_SERVER)],
+            env={**os.environ, "NWS_API_BASE": stub.base_url, "NWS_GRIDPOINT_DB": str(Path(tmp) / "gridpoints.sqlite3")},
+        )
+        async with stdio_client(params, errlog=errlog) as (read, write), ClientSession(read, write) as session:
+            await session.initialize()
+            for _ in range(args.warmup):
+                await session.call_tool(*next_call(args.workload))
+            stub.request_counts.clear()
+            samples, errors, elapsed = await measure(session, args)
+
+    report("all", [s for values in samples.values() for s in values], elapsed)
+    for name, values in samples.items():
+        if values:
+            report(name, values, elapsed)
+    print("errors:", dict(errors))
+    print("upstream requests:", dict(stub.request_counts))
+
+
+async def run_forecasts(requests: int, cache: bool) -> tuple[list[float], float]:
+    weather.response_cache.clear()
+    samples = []
+    start = time.perf_counter()
+    for i in range(requests):
+        if not cache:
+            weather.response_cache.clear()
+        t0 = time.perf_counter()
+        await weather.get_forecast(37.0 + i % 10 / 10, -122.0)
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - start
+
+
+async def run_pooling(args: argparse.Namespace, stub: NWSStub) -> None:
+    """同一プロセス内で get_forecast を直接呼び、接続の再利用とキャッシュの効果を比べる。"""
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    weather.NWS_API_BASE = stub.base_url
+
+    # 従来の動作: リクエストごとにクライアントを生成する
+    samples, elapsed = await run_forecasts(args.requests, cache=False)
+    report("per-request", samples, elapsed)
+
+    # lifespanで生成したプール済みクライアントを使う
+    weather.NWS_GRIDPOINT_DB = ""
+    async with weather.lifespan(weather.mcp):
+        samples, elapsed = await run_forecasts(args.requests, cache=False)
+        report("pooled", samples, elapsed)
+
+    # レスポンスキャッシュとグリッドキャッシュも有効にする
+    with tempfile.TemporaryDirectory() as tmp:
+        weather.NWS_GRIDPOINT_DB = str(Path(tmp) / "gridpoints.sqlite3")
+        async with weather.lifespan(weather.mcp):
+            samples, elapsed = await run_forecasts(args.requests, cache=True)
+        report("pooled+cache", samples, elapsed)
+    print("upstream requests:", dict(stub.request_counts))
+    print("cache:", weather.response_cache.snapshot())
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="weather.py latency benchmark")
+    parser.add_argument("--scenario", choices=["stdio", "pooling"], default="stdio")
+    parser.add_argument("--workload", choices=["alerts", "forecast", "mixed"], default="mixed")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=0, help="計測前に捨てる呼び出し回数")
+    parser.add_argument("--latency", type=float, default=0.0, help="スタブが各リクエストに加える遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に加える0〜jitter秒の揺らぎ")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="スタブが503を返す割合")
+    parser.add_argument("--fixtures", help="記録済みNWSレスポンスのディレクトリ（省略時は合成データ）")
+    parser.add_argument("--record", action="store_true", help="fixturesにないレスポンスを本物のAPIから記録する")
+    parser.add_argument("--port", type=int, default=STUB_PORT)
+    parser.add_argument("--server-log", default=os.devnull, help="weather.py の標準エラー出力の書き込み先")
+    args = parser.parse_args()
+    random.seed(0)
+
+    stub = NWSStub(
+        f"http://{STUB_HOST}:{args.port}",
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        fixtures=args.fixtures,
+        record=args.record,
+    )
+    server = uvicorn.Server(uvicorn.Config(stub.app(), host=STUB_HOST, port=args.port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    try:
+        if args.scenario == "stdio":
+            await run_stdio(args, stub)
+        else:
+            await run_pooling(args, stub)
+    finally:
+        server.should_exit = True
+        await serve_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())